@@ -1,20 +1,33 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import hashlib
+import io
 import os
-import json
+import uuid
 from datetime import datetime, timedelta
 import calendar
+from itertools import islice
+import altair as alt
+
+from hall_booking.analytics import WEEKDAYS, UtilizationStats, pending_latency
+from hall_booking.conflicts import RESOLUTION_POLICIES, PendingConflicts
+from hall_booking.config import (HALLS, DEFAULT_HALL, MASTER_FILE, STORAGE_BACKEND, WORKING_HOURS, MAX_SERIES_OCCURRENCES,
+                                 MINUTES_PER_DAY, HR_PAGE_SIZE, METRICS_FILE, METRICS_WRITE_INTERVAL)
+from hall_booking.directory import read_directory, verify_login
+from hall_booking.engine import (archive_finished, check_series, find_free_halls, find_free_slots, query_bookings_page,
+                                 query_requests_page, series_occurrences)
+from hall_booking.ical import iter_bookings, iter_calendar
+from hall_booking.imports import (IMPORT_COLUMNS, OPTIONAL_IMPORT_COLUMNS, import_bookings, plan_import, read_import_sheet,
+                                  rejection_report)
+from hall_booking.index import BookingIndex
+from hall_booking.metrics import METRICS, timed
+from hall_booking.models import Booking, booking_interval, to_minutes
+from hall_booking.storage import BookingConflictError, approved_booking, file_signature, open_storage
+from hall_booking.store import SharedBookingStore
 
 # Set page configuration
 st.set_page_config(page_title="Hall Booking System", layout="wide")
 
-# File paths
-MASTER_FILE = r"D:\\Downloads\\master_data.xlsx"
-BOOKINGS_FILE = "bookings.json"
-PENDING_FILE = "pending_bookings.json"
-
 # Custom CSS to improve UI
 st.markdown("""
 <style>
@@ -86,6 +99,16 @@ st.markdown("""
         opacity: 0.5;
         background-color: #f5f5f5;
     }
+    .calendar-grid {
+        display: grid;
+        grid-template-columns: repeat(7, minmax(0, 1fr));
+        gap: 2px;
+        margin-bottom: 10px;
+    }
+    .calendar-day-name {
+        text-align: center;
+        font-weight: bold;
+    }
 </style>
 """, unsafe_allow_html=True)
 
@@ -119,86 +142,158 @@ if 'current_view_month' not in st.session_state:
     st.session_state.current_view_month = datetime.now().month
 if 'current_view_year' not in st.session_state:
     st.session_state.current_view_year = datetime.now().year
+if 'selected_hall' not in st.session_state:
+    st.session_state.selected_hall = DEFAULT_HALL
+if 'calendar_hall' not in st.session_state:
+    st.session_state.calendar_hall = None
+if 'free_halls' not in st.session_state:
+    st.session_state.free_halls = []
+if 'free_slots' not in st.session_state:
+    st.session_state.free_slots = None
+if 'series_check' not in st.session_state:
+    st.session_state.series_check = None
+if 'hr_manage_page' not in st.session_state:
+    st.session_state.hr_manage_page = 0
+if 'hr_manage_filters' not in st.session_state:
+    st.session_state.hr_manage_filters = None
+if 'hr_decision_message' not in st.session_state:
+    st.session_state.hr_decision_message = None
+if 'last_rerun_trace' not in st.session_state:
+    st.session_state.last_rerun_trace = []
+if 'bulk_import_plan' not in st.session_state:
+    st.session_state.bulk_import_plan = None
+if 'bulk_import_key' not in st.session_state:
+    st.session_state.bulk_import_key = 0
+if 'bulk_import_message' not in st.session_state:
+    st.session_state.bulk_import_message = None
+if 'past_bookings_limit' not in st.session_state:
+    st.session_state.past_bookings_limit = HR_PAGE_SIZE
 
-# Function to load master data
-@st.cache_data
-def load_master_data():
-    if os.path.exists(MASTER_FILE):
-        df = pd.read_excel(MASTER_FILE)
-        return df
-    else:
+# Function to read the employee directory for a given master file signature,
+# shared across sessions until the master file changes
+@st.cache_resource
+def read_employee_directory(signature):
+    if signature is None:
         st.error(f"Master file {MASTER_FILE} not found!")
-        return pd.DataFrame(columns=["Employee_ID", "Employee_Name", "Password", "Role"])
+    return read_directory(signature)
 
-# Function to load bookings
-def load_bookings():
-    if os.path.exists(BOOKINGS_FILE):
-        with open(BOOKINGS_FILE, 'r') as file:
-            try:
-                return json.load(file)
-            except json.JSONDecodeError:
-                return []
-    else:
-        return []
+# Function to load the employee directory, refreshed when the master file changes
+@timed("load_employee_directory")
+def load_employee_directory():
+    return read_employee_directory(file_signature(MASTER_FILE))
+
+# Function to get the configured storage backend, shared across reruns
+@st.cache_resource
+def get_storage():
+    return open_storage(STORAGE_BACKEND)
+
+# Function to get the bookings and pending requests held in memory for every session
+@st.cache_resource
+def get_booking_store():
+    return SharedBookingStore(get_storage())
 
 # Function to load pending bookings
 def load_pending_bookings():
-    if os.path.exists(PENDING_FILE):
-        with open(PENDING_FILE, 'r') as file:
-            try:
-                return json.load(file)
-            except json.JSONDecodeError:
-                return []
-    else:
-        return []
-
-# Function to save bookings
-def save_bookings(bookings):
-    with open(BOOKINGS_FILE, 'w') as file:
-        json.dump(bookings, file)
-
-# Function to save pending bookings
-def save_pending_bookings(pending_bookings):
-    with open(PENDING_FILE, 'w') as file:
-        json.dump(pending_bookings, file)
-
-# Function to check if a time slot is available
-def is_slot_available(start_datetime, end_datetime, bookings):
-    for booking in bookings:
-        booking_start = datetime.strptime(booking['start_datetime'], "%Y-%m-%d %H:%M")
-        booking_end = datetime.strptime(booking['end_datetime'], "%Y-%m-%d %H:%M")
-        
-        # Check if there's an overlap
-        if (start_datetime < booking_end and end_datetime > booking_start):
-            return False
-    return True
-
-# Function to hash password
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-# Function to verify login
-def verify_login(employee_id, password, master_data):
-    if master_data.empty:
-        return False, "", False
-        
-    # Convert employee_id to the appropriate type if necessary
-    if master_data['Employee_ID'].dtype == 'int64':
-        employee_id = int(employee_id)
+    return get_booking_store().get_pending()
+
+# Function to get the shared booking index, rebuilt only when the bookings version changes
+def get_booking_index():
+    return get_booking_store().get_index()
+
+# Function to run a storage write and apply its effect to the shared booking
+# index instead of rebuilding the index on the next rerun
+def write_bookings(write, *args, added=(), removed=()):
+    return get_booking_store().write(write, *args, added=added, removed=removed)
+
+# Function to build the series report shown in the booking form
+def build_series_report(occurrences, statuses):
+    return pd.DataFrame({
+        "Date": [start.strftime("%d-%m-%Y (%a)") for start, _ in occurrences],
+        "Time": [f"{start.strftime('%H:%M')} - {end.strftime('%H:%M')}" for start, end in occurrences],
+        "Status": statuses,
+    })
+
+# Function to book every available occurrence of the checked series in one write
+def book_series():
+    series = st.session_state.series_check
+    if series is None:
+        return
+    occurrences = [occurrence for occurrence, status in zip(series['occurrences'], series['statuses']) if status == "Available"]
+    if not occurrences:
+        st.error("None of the occurrences are available.")
+        return
+    
+    series_id = uuid.uuid4().hex
+    status = 'approved' if st.session_state.is_hr else 'pending'
+    new_bookings = [
+        Booking(
+            st.session_state.user_id,
+            st.session_state.user_name,
+            to_minutes(start),
+            to_minutes(end),
+            st.session_state.booking_purpose,
+            status,
+            hall=series['hall'],
+            series_id=series_id,
+        )
+        for start, end in occurrences
+    ]
     
-    user = master_data[master_data['Employee_ID'] == employee_id]
+    try:
+        if st.session_state.is_hr:
+            write_bookings(get_storage().add_bookings, new_bookings, added=new_bookings)
+            st.success(f"Booked {len(new_bookings)} occurrences!")
+        else:
+            get_storage().add_pending_bookings(new_bookings)
+            st.success(f"Submitted {len(new_bookings)} occurrences for HR approval!")
+    except BookingConflictError as error:
+        st.error(f"{error} Please check the series again.")
     
-    if not user.empty:
-        stored_password = user['Password'].values[0]
-        is_hr = user['Role'].values[0].upper() == 'HR' if 'Role' in user.columns else False
-        user_name = user['Employee_Name'].values[0]
-        
-        # If passwords are stored as hashes in the Excel file
-        # return stored_password == hash_password(password), user_name, is_hr
-        
-        # If passwords are stored in plain text in the Excel file (not recommended for production)
-        return stored_password == password, user_name, is_hr
-    return False, "", False
+    st.session_state.series_check = None
+    st.session_state.booking_purpose = ""
+
+# Function to prefill the booking form with a free slot found by the finder
+def select_free_slot(start_datetime, duration):
+    st.session_state.selected_date = start_datetime.date()
+    st.session_state.selected_start_time = start_datetime.time()
+    st.session_state.selected_end_time = (start_datetime + timedelta(minutes=duration)).time()
+    st.session_state.availability_checked = True
+    st.session_state.is_available = True
+
+# Function to move bookings that finished before today out of the hot store
+# into the monthly archive. Runs at most once a day per process.
+@timed("archive_past_bookings")
+def archive_past_bookings():
+    archive_finished(get_storage())
+
+# Function to read an archived month, bucketed by day like BookingIndex.month_bookings
+@st.cache_resource(max_entries=24)
+def read_archived_month(year, month, version):
+    return BookingIndex(get_storage().load_archived(year, month)).month_bookings(year, month)
+
+# Function to get the archived bookings of a month; only past months are looked up
+def load_archived_month(year, month):
+    today = datetime.now().date()
+    if (year, month) > (today.year, today.month):
+        return {}
+    storage = get_storage()
+    return read_archived_month(year, month, storage.archive_version(year, month))
+
+# Function to get the archived bookings of a month as one list sorted by start
+def load_archived_bookings(year, month):
+    month_bookings = load_archived_month(year, month)
+    return [booking for day in sorted(month_bookings) for booking in month_bookings[day]]
+
+# Function to build an iCalendar file of confirmed bookings, archived months in
+# the range included. Only called when the download is clicked. Streamlit holds
+# every download in memory, so the file is encoded chunk by chunk into one
+# buffer and not cached; the CLI and the HTTP API stream large exports instead.
+def export_calendar(name, user_id, start, end, purposes, index):
+    buffer = io.BytesIO()
+    for chunk in iter_calendar(iter_bookings(get_storage(), index, user_id, start, end), name, purposes=purposes):
+        buffer.write(chunk.encode())
+    buffer.seek(0)
+    return buffer
 
 # Function to handle logout
 def logout():
@@ -206,6 +301,7 @@ def logout():
     st.session_state.user_id = None
     st.session_state.user_name = None
     st.session_state.is_hr = False
+    st.session_state.past_bookings_limit = HR_PAGE_SIZE
 
 # Function to update session state for date/time selection
 def update_date_selection(date):
@@ -223,6 +319,11 @@ def update_end_time(time):
 def update_purpose(purpose):
     st.session_state.booking_purpose = purpose
 
+def update_hall(hall):
+    st.session_state.selected_hall = hall
+    st.session_state.availability_checked = False
+    st.session_state.free_slots = None
+
 def check_availability():
     start_datetime = datetime.combine(st.session_state.selected_date, st.session_state.selected_start_time)
     end_datetime = datetime.combine(st.session_state.selected_date, st.session_state.selected_end_time)
@@ -239,11 +340,12 @@ def check_availability():
         st.session_state.is_available = False
         return
     
-    bookings = load_bookings()
-    is_available = is_slot_available(start_datetime, end_datetime, bookings)
+    # One pass over the per-hall indexes answers both the selected hall and the alternatives
+    free_halls = find_free_halls(start_datetime, end_datetime, get_booking_index())
     
     st.session_state.availability_checked = True
-    st.session_state.is_available = is_available
+    st.session_state.is_available = st.session_state.selected_hall in free_halls
+    st.session_state.free_halls = free_halls
 
 def book_hall():
     if not st.session_state.is_available:
@@ -254,42 +356,43 @@ def book_hall():
     end_datetime = datetime.combine(st.session_state.selected_date, st.session_state.selected_end_time)
     
     # Create booking object
-    new_booking = {
-        'user_id': st.session_state.user_id,
-        'booked_by': st.session_state.user_name,
-        'start_datetime': start_datetime.strftime("%Y-%m-%d %H:%M"),
-        'end_datetime': end_datetime.strftime("%Y-%m-%d %H:%M"),
-        'purpose': st.session_state.booking_purpose,
-        'status': 'pending'
-    }
+    new_booking = Booking(
+        st.session_state.user_id,
+        st.session_state.user_name,
+        to_minutes(start_datetime),
+        to_minutes(end_datetime),
+        st.session_state.booking_purpose,
+        hall=st.session_state.selected_hall,
+    )
     
-    # If HR is booking, auto-approve
-    if st.session_state.is_hr:
-        new_booking['status'] = 'approved'
-        bookings = load_bookings()
-        bookings.append(new_booking)
-        save_bookings(bookings)
-        st.success("Hall booked successfully!")
-    else:
-        # Add to pending bookings
-        pending_bookings = load_pending_bookings()
-        pending_bookings.append(new_booking)
-        save_pending_bookings(pending_bookings)
-        st.success("Booking request submitted and pending HR approval!")
+    # The slot is checked again atomically with the write; if another session
+    # took it since "Check Availability", the write is rejected
+    try:
+        # If HR is booking, auto-approve
+        if st.session_state.is_hr:
+            new_booking.status = 'approved'
+            write_bookings(get_storage().add_booking, new_booking, added=[new_booking])
+            st.success("Hall booked successfully!")
+        else:
+            # Add to pending bookings
+            get_storage().add_pending(new_booking)
+            st.success("Booking request submitted and pending HR approval!")
+    except BookingConflictError as error:
+        st.error(f"{error} Someone else may have just booked it. Please check availability and try again.")
     
     # Reset form
     st.session_state.booking_purpose = ""
     st.session_state.availability_checked = False
     st.session_state.is_available = False
 
-# Calendar navigation functions
+# Calendar navigation functions, used as button callbacks so the calendar
+# fragment renders the new month in the same run
 def prev_month():
     if st.session_state.current_view_month == 1:
         st.session_state.current_view_month = 12
         st.session_state.current_view_year -= 1
     else:
         st.session_state.current_view_month -= 1
-    st.rerun()  # Force page refresh to update calendar
 
 def next_month():
     if st.session_state.current_view_month == 12:
@@ -297,228 +400,480 @@ def next_month():
         st.session_state.current_view_year += 1
     else:
         st.session_state.current_view_month += 1
-    st.rerun()  # Force page refresh to update calendar
 
-# Function to display improved calendar with bookings
-def display_calendar(bookings):
+# Function to build the month grid as a single HTML block
+def build_month_html(year, month, hall, month_bookings, selected_date, today):
+    first_weekday, days_in_month = calendar.monthrange(year, month)
+    
+    # Header row of day names, then blank cells up to the first weekday
+    cells = [f"<div class='calendar-day-name'>{day_name}</div>" for day_name in ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]]
+    cells.extend("<div class='calendar-day' style='opacity:0.3;'></div>" for _ in range(first_weekday))
+    
+    for day in range(1, days_in_month + 1):
+        date_obj = datetime(year, month, day).date()
+        is_today = date_obj == today
+        is_past_date = date_obj < today
+        day_bookings = month_bookings.get(day, [])
+        
+        # Determine cell style
+        cell_style = "calendar-day"
+        if is_today:
+            cell_style += " border-primary"
+        if date_obj == selected_date:
+            cell_style += " bg-light"
+        if is_past_date:
+            cell_style += " past-date"
+        
+        if day_bookings:
+            content = "".join(
+                f"<div class='booking-slot'>"
+                f"{booking.start_datetime.strftime('%H:%M')} - {booking.end_datetime.strftime('%H:%M')}"
+                f"{f'<br>{booking.hall}' if len(HALLS) > 1 and not hall else ''}"
+                f"<br>{booking.booked_by}"
+                f"</div>"
+                for booking in day_bookings
+            )
+        elif is_past_date:
+            content = "<div class='unavailable-text'>Past Date</div>"
+        else:
+            content = "<div class='available-text'>Available</div>"
+        cells.append(
+            f"<div class='{cell_style}'>"
+            f"<div class='calendar-day-header'>{day}{' (Today)' if is_today else ''}</div>"
+            f"{content}</div>"
+        )
+    
+    return f"<div class='calendar-grid'>{''.join(cells)}</div>"
+
+# Function to get the month grid HTML, memoized per month, hall, bookings
+# version, selected date and today. Archiving a month always changes the
+# bookings version too, so archived history needs no key of its own.
+@st.cache_data(max_entries=64)
+def render_month_html(year, month, hall, version, selected_date, today, _index):
+    # Only this month's bookings, bucketed by day; archived history is read
+    # only when a past month is opened
+    month_bookings = _index.month_bookings(year, month, hall)
+    archived = load_archived_month(year, month)
+    if archived:
+        month_bookings = dict(month_bookings)
+        for day, day_bookings in archived.items():
+            if hall:
+                day_bookings = [b for b in day_bookings if b.hall == hall]
+            if day_bookings:
+                month_bookings[day] = sorted(day_bookings + month_bookings.get(day, []), key=booking_interval)
+    return build_month_html(year, month, hall, month_bookings, selected_date, today)
+
+# Function to display improved calendar with bookings. Runs as a fragment, so
+# changing month or hall only re-executes the calendar.
+@st.fragment
+@timed("display_calendar")
+def display_calendar():
     st.subheader("Hall Booking Calendar")
     
     # Calendar navigation
     col1, col2, col3 = st.columns([1, 3, 1])
     with col1:
-        if st.button("← Previous Month"):
-            prev_month()
+        st.button("← Previous Month", on_click=prev_month)
+    with col3:
+        st.button("Next Month →", on_click=next_month)
+    year, month = st.session_state.current_view_year, st.session_state.current_view_month
+    with col2:
+        st.markdown(f"<h3 style='text-align: center;'>{calendar.month_name[month]} {year}</h3>", unsafe_allow_html=True)
+    
+    # Hall filter, only shown when there is more than one hall
+    if len(HALLS) > 1:
+        options = ["All halls"] + HALLS
+        current = st.session_state.calendar_hall or "All halls"
+        choice = st.selectbox("Hall", options, index=options.index(current) if current in options else 0, key="calendar_hall_select")
+        st.session_state.calendar_hall = None if choice == "All halls" else choice
+    hall = st.session_state.calendar_hall
+    
+    index = get_booking_index()
+    today = datetime.now().date()
+    st.markdown(render_month_html(year, month, hall, index.version, st.session_state.selected_date, today, index),
+                unsafe_allow_html=True)
+    
+    # Pick a date of this month for the booking form; the form lives outside the
+    # fragment, so choosing a date reruns the whole app
+    days_in_month = calendar.monthrange(year, month)[1]
+    dates = [d for d in (datetime(year, month, day).date() for day in range(1, days_in_month + 1)) if d >= today]
+    if dates:
+        col_date, col_select = st.columns([3, 1])
+        with col_date:
+            chosen = st.selectbox(
+                "Date",
+                dates,
+                index=dates.index(st.session_state.selected_date) if st.session_state.selected_date in dates else 0,
+                format_func=lambda d: d.strftime("%d-%m-%Y (%a)"),
+                key=f"calendar_date_{year}_{month}",
+                label_visibility="collapsed",
+            )
+        with col_select:
+            if st.button("Select date", key="calendar_select_date"):
+                update_date_selection(chosen)
+                st.rerun(scope="app")
+
+# Function to yield the user's finished bookings, newest first: those still in
+# the hot store, then archived months from the most recent back. Archived months
+# are only read as far as the caller iterates.
+def iter_past_bookings(user_id, index, now):
+    yield from reversed([b for b in index.user_bookings(user_id) if b.end <= now])
+    storage = get_storage()
+    for year, month in reversed(storage.archived_months()):
+        month_bookings = read_archived_month(year, month, storage.archive_version(year, month))
+        archived = [b for day_bookings in month_bookings.values() for b in day_bookings if str(b.user_id) == str(user_id)]
+        yield from sorted(archived, key=booking_interval, reverse=True)
+
+# Function to display one of the user's bookings, with a Cancel button keyed by
+# the booking's id when it can still be cancelled
+def display_user_booking(booking, can_cancel):
+    start_datetime = booking.start_datetime
+    end_datetime = booking.end_datetime
+    
+    st.markdown(f"<div class='custom-card'>", unsafe_allow_html=True)
+    col1, col2, col3 = st.columns([3, 3, 1])
+    with col1:
+        st.write(f"📅 **Date:** {start_datetime.strftime('%d-%m-%Y')}")
+        st.write(f"⏰ **Time:** {start_datetime.strftime('%H:%M')} - {end_datetime.strftime('%H:%M')}")
     with col2:
-        st.markdown(f"<h3 style='text-align: center;'>{calendar.month_name[st.session_state.current_view_month]} {st.session_state.current_view_year}</h3>", unsafe_allow_html=True)
+        st.write(f"📝 **Purpose:** {booking.purpose or 'N/A'}")
+        st.write(f"👤 **Booked by:** {booking.booked_by}")
+        if len(HALLS) > 1:
+            st.write(f"🏛️ **Hall:** {booking.hall}")
     with col3:
-        if st.button("Next Month →"):
-            next_month()
-    
-    # Get first day of month and number of days in month
-    first_day = datetime(st.session_state.current_view_year, st.session_state.current_view_month, 1)
-    days_in_month = calendar.monthrange(st.session_state.current_view_year, st.session_state.current_view_month)[1]
-    
-    # Get the weekday of the first day (0 is Monday in calendar module)
-    first_weekday = calendar.monthrange(st.session_state.current_view_year, st.session_state.current_view_month)[0]
-    
-    # Create calendar grid
-    # Display day names (header row)
-    day_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    cols = st.columns(7)
-    for i, day_name in enumerate(day_names):
-        with cols[i]:
-            st.markdown(f"<div style='text-align:center; font-weight:bold;'>{day_name}</div>", unsafe_allow_html=True)
-    
-    # Calculate total number of cells needed (previous month days + current month days)
-    total_cells = first_weekday + days_in_month
-    weeks = (total_cells + 6) // 7  # Round up to complete weeks
-    
-    # Current date for comparison
-    current_date = datetime.now().date()
-    
-    # Display the calendar cells
-    day_counter = 1
-    for week in range(weeks):
-        cols = st.columns(7)
-        for weekday in range(7):
-            with cols[weekday]:
-                if (week == 0 and weekday < first_weekday) or (day_counter > days_in_month):
-                    # Empty cell
-                    st.markdown("<div class='calendar-day' style='opacity:0.3;'></div>", unsafe_allow_html=True)
-                else:
-                    # Valid day cell
-                    date_obj = datetime(st.session_state.current_view_year, st.session_state.current_view_month, day_counter).date()
-                    is_today = date_obj == current_date
-                    is_selected = date_obj == st.session_state.selected_date
-                    is_past_date = date_obj < current_date
-                    
-                    # Find bookings for this date
-                    date_str = date_obj.strftime("%Y-%m-%d")
-                    day_bookings = [b for b in bookings if date_str in b['start_datetime']]
-                    
-                    # Determine cell style
-                    cell_style = "calendar-day"
-                    if is_today:
-                        cell_style += " border-primary"
-                    if is_selected:
-                        cell_style += " bg-light"
-                    if is_past_date:
-                        cell_style += " past-date"
-                    
-                    # Day cell content
-                    st.markdown(
-                        f"""
-                        <div class='{cell_style}'>
-                            <div class='calendar-day-header'>
-                                {day_counter}{" (Today)" if is_today else ""}
-                            </div>
-                        """
-                        + (
-                            "".join([
-                                f"""
-                                <div class='booking-slot'>
-                                    {datetime.strptime(booking['start_datetime'], "%Y-%m-%d %H:%M").strftime("%H:%M")} - 
-                                    {datetime.strptime(booking['end_datetime'], "%Y-%m-%d %H:%M").strftime("%H:%M")}
-                                    <br>{booking['booked_by']}
-                                </div>
-                                """
-                                for booking in day_bookings
-                            ])
-                            if day_bookings
-                            else (
-                                "<div class='unavailable-text'>Past Date</div>" 
-                                if is_past_date 
-                                else "<div class='available-text'>Available</div>"
-                            )
-                        )
-                        + "</div>",
-                        unsafe_allow_html=True,
-                    )
-                    
-                    # Add a button to select this date with formatted date
-                    formatted_date = date_obj.strftime("%d-%m-%Y")
-                    if st.button(f"Select {formatted_date}", key=f"select_day_{date_obj}", disabled=is_past_date):
-                        update_date_selection(date_obj)
-                    
-                    day_counter += 1
+        if can_cancel and st.button("Cancel", key=f"cancel_{booking.id}"):
+            try:
+                write_bookings(get_storage().cancel_booking, booking, removed=[booking])
+            except BookingConflictError as error:
+                st.warning(str(error))
+            else:
+                st.success("Booking cancelled successfully!")
+                st.rerun()
+    st.markdown("</div>", unsafe_allow_html=True)
 
-# Function to display user's bookings
-def display_user_bookings(user_id, bookings):
+# Function to display user's bookings: upcoming ones from the per-user index,
+# past ones only when asked for, a page at a time
+@timed("display_user_bookings")
+def display_user_bookings(user_id, index):
     st.subheader("Your Bookings")
     
-    user_bookings = [b for b in bookings if b['user_id'] == user_id]
+    # The file is only built when the button is clicked
+    st.download_button("📅 Add to my calendar (.ics)",
+                       lambda: export_calendar("My hall bookings", user_id, None, None, True, index),
+                       file_name="hall_bookings.ics", mime="text/calendar", key="export_user_ics", on_click="ignore")
     
-    if not user_bookings:
+    now = to_minutes(datetime.now())
+    upcoming = [b for b in index.user_bookings(user_id) if b.end > now]
+    if not upcoming:
         st.info("You have no active bookings.")
-        return
+    for booking in upcoming:
+        display_user_booking(booking, True)
     
-    for i, booking in enumerate(user_bookings):
-        start_datetime = datetime.strptime(booking['start_datetime'], "%Y-%m-%d %H:%M")
-        end_datetime = datetime.strptime(booking['end_datetime'], "%Y-%m-%d %H:%M")
-        
-        st.markdown(f"<div class='custom-card'>", unsafe_allow_html=True)
-        col1, col2, col3 = st.columns([3, 3, 1])
-        with col1:
-            st.write(f"📅 **Date:** {start_datetime.strftime('%d-%m-%Y')}")
-            st.write(f"⏰ **Time:** {start_datetime.strftime('%H:%M')} - {end_datetime.strftime('%H:%M')}")
-        with col2:
-            st.write(f"📝 **Purpose:** {booking.get('purpose', 'N/A')}")
-            st.write(f"👤 **Booked by:** {booking['booked_by']}")
-        with col3:
-            if st.button("Cancel", key=f"cancel_{i}"):
-                bookings.remove(booking)
-                save_bookings(bookings)
-                st.success("Booking cancelled successfully!")
-                st.rerun()
-        st.markdown("</div>", unsafe_allow_html=True)
+    if st.toggle("Show past bookings", key="show_past_bookings"):
+        limit = st.session_state.past_bookings_limit
+        past = list(islice(iter_past_bookings(user_id, index, now), limit + 1))
+        if not past:
+            st.info("You have no past bookings.")
+        for booking in past[:limit]:
+            display_user_booking(booking, False)
+        if len(past) > limit and st.button("Show more", key="past_bookings_more"):
+            st.session_state.past_bookings_limit += HR_PAGE_SIZE
+            st.rerun()
 
-# Function to display pending notifications for the user
-def display_notifications(user_id, pending_bookings, bookings):
-    user_notifications = [b for b in pending_bookings if b['user_id'] == user_id and b.get('status_updated', False)]
+# Function to display the user's unseen booking decisions. Storage is only
+# written when there is something to acknowledge.
+@timed("display_notifications")
+def display_notifications(user_id):
+    user_notifications = get_storage().load_notifications(user_id)
     
     if not user_notifications:
         return
     
     for notification in user_notifications:
         # Convert date format for display
-        start_datetime = datetime.strptime(notification['start_datetime'], "%Y-%m-%d %H:%M")
-        formatted_date = start_datetime.strftime("%d-%m-%Y %H:%M")
+        formatted_date = notification.start_datetime.strftime("%d-%m-%Y %H:%M")
         
-        if notification['status'] == 'approved':
+        if notification.status == 'approved':
             st.success(f"Your booking request for {formatted_date} has been approved!")
         else:
             st.error(f"Your booking request for {formatted_date} has been denied!")
-        
-        # Remove the notification after showing it
-        pending_bookings.remove(notification)
     
-    save_pending_bookings(pending_bookings)
+    # Remove the notifications after showing them
+    get_storage().acknowledge(user_notifications)
 
 # Function to display HR approval section
-def display_hr_section(pending_bookings, bookings):
+@timed("display_hr_section")
+def display_hr_section(pending_requests, index):
     st.subheader("HR Approval Section")
     
-    pending_requests = [b for b in pending_bookings if not b.get('status_updated', False)]
+    # Outcome of the last bulk decision, kept across the rerun that follows it
+    if st.session_state.hr_decision_message:
+        approved_count, denied_count, skipped = st.session_state.hr_decision_message
+        st.session_state.hr_decision_message = None
+        if approved_count or denied_count:
+            st.success(f"Approved {approved_count} and denied {denied_count} request(s).")
+        for label, reason in skipped:
+            st.warning(f"Skipped {label}: {reason}")
     
     if not pending_requests:
         st.info("No pending requests.")
         return
     
+    conflicts = PendingConflicts(pending_requests, index)
+    numbers = {request.id: i + 1 for i, request in enumerate(pending_requests)}
+    
+    display_conflict_resolution(conflicts)
+    display_bulk_decisions(pending_requests)
+    
     for i, request in enumerate(pending_requests):
-        start_datetime = datetime.strptime(request['start_datetime'], "%Y-%m-%d %H:%M")
-        end_datetime = datetime.strptime(request['end_datetime'], "%Y-%m-%d %H:%M")
+        start_datetime = request.start_datetime
+        end_datetime = request.end_datetime
         
         st.markdown(f"<div class='custom-card'>", unsafe_allow_html=True)
         st.write(f"**Request #{i+1}**")
+        if request.id in conflicts.blocked:
+            st.warning(f"⚠️ {request.hall} is already booked at this time.")
+        overlap_count = conflicts.overlap_counts.get(request.id, 0)
+        if overlap_count:
+            shown = [f"#{numbers[other.id]}" for other in conflicts.overlapping(request, 5)]
+            more = f" and {overlap_count - len(shown)} more" if overlap_count > len(shown) else ""
+            st.warning(f"⚠️ Overlaps request(s) {', '.join(shown)}{more}.")
         col1, col2 = st.columns(2)
         with col1:
-            st.write(f"👤 **Employee:** {request['booked_by']}")
+            st.write(f"👤 **Employee:** {request.booked_by}")
             st.write(f"📅 **Date:** {start_datetime.strftime('%d-%m-%Y')}")
             st.write(f"⏰ **Time:** {start_datetime.strftime('%H:%M')} - {end_datetime.strftime('%H:%M')}")
         with col2:
-            st.write(f"📝 **Purpose:** {request.get('purpose', 'N/A')}")
+            st.write(f"📝 **Purpose:** {request.purpose or 'N/A'}")
+            if len(HALLS) > 1:
+                st.write(f"🏛️ **Hall:** {request.hall}")
             
             col_approve, col_deny = st.columns(2)
             with col_approve:
-                if st.button("Approve", key=f"approve_{i}"):
-                    # Mark as approved
-                    request['status'] = 'approved'
-                    request['status_updated'] = True
-                    
-                    # Add to confirmed bookings
-                    bookings.append(request.copy())
-                    
-                    # Save changes
-                    save_bookings(bookings)
-                    save_pending_bookings(pending_bookings)
-                    
-                    st.success("Request approved!")
-                    st.rerun()
+                if st.button("Approve", key=f"approve_{request.id}"):
+                    # Mark as approved and add to confirmed bookings in one write,
+                    # provided the request is still undecided and the slot still free
+                    try:
+                        write_bookings(get_storage().approve, request, added=lambda approved: [approved_booking(approved)])
+                    except BookingConflictError as error:
+                        st.error(f"Could not approve: {error}")
+                    else:
+                        st.success("Request approved!")
+                        st.rerun()
             
             with col_deny:
-                if st.button("Deny", key=f"deny_{i}"):
+                if st.button("Deny", key=f"deny_{request.id}"):
                     # Mark as denied
-                    request['status'] = 'denied'
-                    request['status_updated'] = True
-                    
-                    # Save changes
-                    save_pending_bookings(pending_bookings)
-                    
-                    st.error("Request denied!")
-                    st.rerun()
+                    try:
+                        get_storage().deny(request)
+                    except BookingConflictError as error:
+                        st.warning(f"Could not deny: {error}")
+                    else:
+                        st.error("Request denied!")
+                        st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
 
+# Function to deny, in one write, the requests that lose their conflict cluster
+# under a policy, or that overlap a confirmed booking
+def display_conflict_resolution(conflicts):
+    if not conflicts.clusters and not conflicts.blocked:
+        return
+    
+    with st.expander("Resolve conflicts"):
+        clustered = sum(len(cluster) for cluster in conflicts.clusters)
+        st.write(f"{clustered} request(s) in {len(conflicts.clusters)} group(s) of overlapping requests; "
+                 f"{len(conflicts.blocked)} request(s) overlap confirmed bookings.")
+        policy = st.selectbox(
+            "Keep in each group",
+            list(RESOLUTION_POLICIES),
+            format_func=lambda name: {
+                "first-come": "The earliest request",
+                "priority": "HR staff first, then the earliest request",
+                "shortest": "The shortest request",
+            }[name],
+            key="hr_conflict_policy",
+        )
+        losers = conflicts.resolve(policy, load_employee_directory())
+        for request, reason in losers[:HR_PAGE_SIZE]:
+            st.write(f"❌ {request_label(request)}: {reason}")
+        if len(losers) > HR_PAGE_SIZE:
+            st.write(f"… and {len(losers) - HR_PAGE_SIZE} more.")
+        deny_clicked = st.button(f"Deny {len(losers)} request(s)", key="hr_conflict_deny", disabled=not losers)
+    
+    if deny_clicked:
+        try:
+            approved, denied, skipped = get_storage().decide([], [request for request, _ in losers])
+        except BookingConflictError as error:
+            st.error(f"Could not apply the decisions: {error}")
+            return
+        st.session_state.hr_decision_message = (
+            len(approved), len(denied), [(request_label(request), reason) for request, reason in skipped]
+        )
+        st.rerun()
+
+# Function to label a pending request for the bulk decision list
+def request_label(request):
+    start_datetime = request.start_datetime
+    label = f"{request.booked_by} – {start_datetime.strftime('%d-%m-%Y %H:%M')}-{request.end_datetime.strftime('%H:%M')}"
+    if len(HALLS) > 1:
+        label += f" ({request.hall})"
+    return label
+
+# Function to approve or deny several pending requests at once. The selection is
+# checked against confirmed bookings and against itself, and every decision is
+# committed with a single write.
+def display_bulk_decisions(pending_requests):
+    requests_by_id = {request.id: request for request in pending_requests}
+    
+    with st.expander("Bulk decisions"):
+        select_all = st.checkbox("Select all", key="hr_bulk_select_all")
+        selected_ids = st.multiselect(
+            "Requests",
+            list(requests_by_id),
+            default=list(requests_by_id) if select_all else [],
+            format_func=lambda request_id: request_label(requests_by_id[request_id]),
+            key=f"hr_bulk_selection_{select_all}",
+        )
+        selected = [requests_by_id[request_id] for request_id in selected_ids]
+        
+        col_approve, col_deny = st.columns(2)
+        with col_approve:
+            approve_clicked = st.button("Approve selected", key="hr_bulk_approve", disabled=not selected)
+        with col_deny:
+            deny_clicked = st.button("Deny selected", key="hr_bulk_deny", disabled=not selected)
+    
+    if approve_clicked or deny_clicked:
+        approvals, denials = (selected, []) if approve_clicked else ([], selected)
+        try:
+            approved, denied, skipped = write_bookings(
+                get_storage().decide, approvals, denials,
+                added=lambda result: [approved_booking(request) for request in result[0]],
+            )
+        except BookingConflictError as error:
+            st.error(f"Could not apply the decisions: {error}")
+            return
+        st.session_state.hr_decision_message = (
+            len(approved), len(denied), [(request_label(request), reason) for request, reason in skipped]
+        )
+        st.rerun()
+
+# Function to import a sheet of pre-arranged bookings. The sheet is checked once
+# per upload and bookings version; accepted rows are confirmed in one write and
+# rejected rows can be downloaded with the reason for each.
+@timed("display_bulk_import")
+def display_bulk_import():
+    if st.session_state.bulk_import_message:
+        st.success(st.session_state.bulk_import_message)
+        st.session_state.bulk_import_message = None
+    
+    with st.expander("📥 Bulk import bookings from Excel/CSV"):
+        st.caption(f"Columns: {', '.join(IMPORT_COLUMNS)}, and optionally {', '.join(OPTIONAL_IMPORT_COLUMNS)}. "
+                   "Dates as YYYY-MM-DD or DD-MM-YYYY, times as HH:MM.")
+        uploaded = st.file_uploader("Booking sheet", type=["xlsx", "xls", "csv"], key=f"bulk_import_file_{st.session_state.bulk_import_key}")
+        if uploaded is None:
+            st.session_state.bulk_import_plan = None
+            return
+        
+        index = get_booking_index()
+        plan = st.session_state.bulk_import_plan
+        if plan is None or plan[0] != (uploaded.file_id, index.version):
+            try:
+                sheet = read_import_sheet(uploaded, uploaded.name)
+                bookings, rejections = plan_import(sheet, load_employee_directory(), index)
+            except Exception as error:
+                st.error(f"Could not read the sheet: {error}")
+                return
+            plan = ((uploaded.file_id, index.version), bookings, rejections)
+            st.session_state.bulk_import_plan = plan
+        _, bookings, rejections = plan
+        
+        st.write(f"**{len(bookings)}** row(s) ready to import, **{len(rejections)}** rejected.")
+        if len(rejections):
+            st.dataframe(rejections[['Row', 'Employee_ID', 'Reason']], hide_index=True)
+            st.download_button("Download rejection report", rejection_report(rejections), file_name="rejected_bookings.csv",
+                               mime="text/csv", key="bulk_import_report", on_click="ignore")
+        
+        if bookings and st.button(f"Import {len(bookings)} booking(s)", key="bulk_import_confirm"):
+            try:
+                write_bookings(import_bookings, get_storage(), bookings, added=bookings)
+            except BookingConflictError as error:
+                st.error(f"Nothing was imported: {error} The sheet has been checked again.")
+                st.session_state.bulk_import_plan = None
+            else:
+                st.session_state.bulk_import_message = f"Imported {len(bookings)} booking(s)."
+                # A fresh uploader, so the imported sheet is not checked against itself
+                st.session_state.bulk_import_plan = None
+                st.session_state.bulk_import_key += 1
+                st.rerun()
+
 # Function to display HR manage bookings section
-def display_hr_manage_bookings(bookings):
+@timed("display_hr_manage_bookings")
+def display_hr_manage_bookings(index):
     st.subheader("Manage Existing Bookings")
     
-    if not bookings:
+    archived_months = get_storage().archived_months()
+    pending_bookings = load_pending_bookings()
+    if not len(index) and not archived_months and not pending_bookings:
         st.info("No active bookings.")
         return
     
-    for i, booking in enumerate(bookings):
-        start_datetime = datetime.strptime(booking['start_datetime'], "%Y-%m-%d %H:%M")
-        end_datetime = datetime.strptime(booking['end_datetime'], "%Y-%m-%d %H:%M")
+    # Filters
+    col_status, col_when, col_from, col_to, col_employee = st.columns([2, 2, 2, 2, 3])
+    with col_status:
+        status = st.selectbox("Status", ["Confirmed", "Awaiting approval"], key="hr_manage_status")
+    with col_when:
+        when = st.selectbox("Show", ["Upcoming", "Past", "Date range"], key="hr_manage_when")
+    with col_from:
+        date_from = st.date_input("From", value=datetime.now().date(), key="hr_manage_from", disabled=when != "Date range")
+    with col_to:
+        date_to = st.date_input("To", value=datetime.now().date() + timedelta(days=30), key="hr_manage_to", disabled=when != "Date range")
+    with col_employee:
+        employee = st.text_input("Employee ID or name", key="hr_manage_employee")
+    
+    now = to_minutes(datetime.now())
+    if when == "Upcoming":
+        start, end, newest_first = now, None, False
+    elif when == "Past":
+        start, end, newest_first = None, now, True
+    else:
+        start = to_minutes(datetime.combine(date_from, datetime.min.time()))
+        end = to_minutes(datetime.combine(date_to, datetime.min.time())) + MINUTES_PER_DAY
+        newest_first = False
+    
+    # Go back to the first page whenever the filters change
+    filters = (status, when, date_from, date_to, employee)
+    if st.session_state.hr_manage_filters != filters:
+        st.session_state.hr_manage_filters = filters
+        st.session_state.hr_manage_page = 0
+    
+    # Confirmed bookings come from the index and the archive, requests waiting
+    # for HR from the pending queue
+    def query_page(page):
+        if status == "Awaiting approval":
+            return query_requests_page(pending_bookings, start, end, employee, newest_first, page)
+        return query_bookings_page(index, start, end, employee, newest_first, page,
+                                   archived_months=archived_months, load_month=load_archived_bookings)
+    
+    page_bookings, total = query_page(st.session_state.hr_manage_page)
+    if not total:
+        st.info("No bookings match these filters.")
+        return
+    
+    # Every booking in the selected period, for every employee
+    if status == "Confirmed":
+        st.download_button("📅 Export period as calendar (.ics)",
+                           lambda: export_calendar("Hall bookings", None, start, end, True, index),
+                           file_name="hall_bookings.ics", mime="text/calendar", key="export_hr_ics", on_click="ignore")
+    
+    page_count = (total + HR_PAGE_SIZE - 1) // HR_PAGE_SIZE
+    if st.session_state.hr_manage_page >= page_count:
+        # The list shrank (e.g. after a cancel); show its last page instead
+        st.session_state.hr_manage_page = page_count - 1
+        page_bookings, total = query_page(st.session_state.hr_manage_page)
+    
+    for booking in page_bookings:
+        start_datetime = booking.start_datetime
+        end_datetime = booking.end_datetime
         
         st.markdown(f"<div class='custom-card'>", unsafe_allow_html=True)
         col1, col2, col3 = st.columns([3, 3, 1])
@@ -526,24 +881,166 @@ def display_hr_manage_bookings(bookings):
             st.write(f"📅 **Date:** {start_datetime.strftime('%Y-%m-%d')}")
             st.write(f"⏰ **Time:** {start_datetime.strftime('%H:%M')} - {end_datetime.strftime('%H:%M')}")
         with col2:
-            st.write(f"📝 **Purpose:** {booking.get('purpose', 'N/A')}")
-            st.write(f"👤 **Booked by:** {booking['booked_by']}")
+            st.write(f"📝 **Purpose:** {booking.purpose or 'N/A'}")
+            st.write(f"👤 **Booked by:** {booking.booked_by}")
+            if len(HALLS) > 1:
+                st.write(f"🏛️ **Hall:** {booking.hall}")
         with col3:
-            if st.button("Cancel", key=f"hr_cancel_{i}"):
-                bookings.remove(booking)
-                save_bookings(bookings)
-                st.success("Booking cancelled successfully!")
-                st.rerun()
+            # Archived bookings have already taken place, and requests are
+            # decided in the pending requests view
+            if status == "Awaiting approval":
+                st.write("⏳ Pending")
+            elif booking.id in index.by_id and st.button("Cancel", key=f"hr_cancel_{booking.id}"):
+                try:
+                    write_bookings(get_storage().cancel_booking, booking, removed=[booking])
+                except BookingConflictError as error:
+                    st.warning(str(error))
+                else:
+                    st.success("Booking cancelled successfully!")
+                    st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
+    
+    # Page navigation
+    col_prev, col_page, col_next = st.columns([1, 3, 1])
+    with col_prev:
+        if st.button("← Previous", key="hr_manage_prev", disabled=st.session_state.hr_manage_page == 0):
+            st.session_state.hr_manage_page -= 1
+            st.rerun()
+    with col_page:
+        st.markdown(f"<div style='text-align: center;'>Page {st.session_state.hr_manage_page + 1} of {page_count} ({total} bookings)</div>", unsafe_allow_html=True)
+    with col_next:
+        if st.button("Next →", key="hr_manage_next", disabled=st.session_state.hr_manage_page >= page_count - 1):
+            st.session_state.hr_manage_page += 1
+            st.rerun()
+
+# Function to get the utilization statistics, shared by every session
+@st.cache_resource
+def get_utilization_stats():
+    return UtilizationStats()
+
+# Function to format a duration in minutes for the analytics page
+def format_duration(minutes):
+    if minutes is None:
+        return "–"
+    if minutes < 60:
+        return f"{minutes:.0f} min"
+    if minutes < MINUTES_PER_DAY:
+        return f"{minutes / 60:.1f} h"
+    return f"{minutes / MINUTES_PER_DAY:.1f} days"
+
+# Function to display the HR analytics page. The statistics only fold in the
+# bookings and decisions that changed since they were last refreshed.
+@timed("display_analytics")
+def display_analytics():
+    st.subheader("Analytics")
+    
+    index = get_booking_index()
+    stats = get_utilization_stats()
+    stats.refresh(get_storage(), index.by_start, index.version)
+    
+    hall = None
+    if len(HALLS) > 1:
+        choice = st.selectbox("Hall", ["All halls"] + HALLS, key="analytics_hall")
+        hall = None if choice == "All halls" else choice
+    
+    pending_requests = [r for r in load_pending_bookings() if hall is None or r.hall == hall]
+    waiting, median_wait, longest_wait = pending_latency(pending_requests, to_minutes(datetime.now()))
+    denial_rate, median_turnaround = stats.decision_totals(hall)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("Pending requests", waiting)
+    with col2:
+        st.metric("Median wait", format_duration(median_wait))
+    with col3:
+        st.metric("Longest wait", format_duration(longest_wait))
+    with col4:
+        st.metric("Denial rate", "–" if denial_rate is None else f"{denial_rate:.1f}%")
+    with col5:
+        st.metric("Median turnaround", format_duration(median_turnaround))
+    
+    st.write("**Occupancy by weekday and hour** (booked hours)")
+    occupancy = stats.occupancy(hall)
+    # Working hours, widened to any hour that has bookings
+    booked_hours = [i for i, total in enumerate(occupancy.sum(axis=1).tolist()) if total]
+    first_hour = min([WORKING_HOURS[0] // 60] + booked_hours)
+    last_hour = max([(WORKING_HOURS[1] - 1) // 60] + booked_hours)
+    heatmap = occupancy.iloc[first_hour:last_hour + 1].reset_index(names="Hour").melt(
+        id_vars="Hour", var_name="Weekday", value_name="Booked hours")
+    st.altair_chart(alt.Chart(heatmap).mark_rect().encode(
+        x=alt.X("Weekday:O", sort=WEEKDAYS),
+        y=alt.Y("Hour:O"),
+        color=alt.Color("Booked hours:Q", scale=alt.Scale(scheme="blues")),
+        tooltip=["Weekday", "Hour", "Booked hours"],
+    ))
+    
+    st.write("**Monthly utilization** (% of weekday working hours booked)")
+    utilization = stats.monthly_utilization(hall)
+    if utilization.empty:
+        st.info("No bookings yet.")
+    else:
+        st.bar_chart(utilization)
+    
+    st.write("**Decisions by month**")
+    summary = stats.decision_summary(hall)
+    if summary.empty:
+        st.info("No decisions recorded yet.")
+    else:
+        st.dataframe(summary)
+    st.caption("Decisions and turnaround times are recorded for requests decided since the decision log was introduced.")
+    
+    st.write("**Top requesters**")
+    requesters = stats.top_requesters()
+    if requesters.empty:
+        st.info("No bookings yet.")
+    else:
+        st.dataframe(requesters, hide_index=True)
+
+# Function to display the diagnostics page: where the previous rerun spent its
+# time, totals per instrumented code path since the process started, and the
+# counters exported to the Prometheus metrics file
+@timed("display_diagnostics")
+def display_diagnostics():
+    st.subheader("Diagnostics")
+    
+    spans, counters, gauges = METRICS.snapshot()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Reruns", counters.get("reruns", 0))
+    with col2:
+        st.metric("Bookings", gauges.get("bookings", 0))
+    with col3:
+        st.metric("Bytes written", f"{counters.get('write_bytes', 0):,}")
+    
+    st.write("**Previous rerun**")
+    trace = st.session_state.last_rerun_trace
+    if trace:
+        st.dataframe(pd.DataFrame({
+            "Span": [name for name, _ in trace],
+            "ms": [round(seconds * 1000, 3) for _, seconds in trace],
+        }), hide_index=True)
+    else:
+        st.info("No rerun has been recorded yet.")
+    
+    st.write("**Since the process started**")
+    if spans:
+        report = pd.DataFrame([
+            {"Span": name, "Calls": calls, "Total ms": total * 1000, "Mean ms": total * 1000 / calls, "Max ms": slowest * 1000}
+            for name, (calls, total, slowest) in spans.items()
+        ]).sort_values("Total ms", ascending=False)
+        st.dataframe(report.round(3), hide_index=True)
+    
+    st.caption(f"Prometheus metrics are written to {os.path.abspath(METRICS_FILE)} at most every {METRICS_WRITE_INTERVAL} seconds.")
+    st.download_button("Download metrics", METRICS.to_prometheus(), file_name="hall_booking_metrics.prom", mime="text/plain")
 
 # Main application
 def main():
     st.title("Hall Booking System")
     
     # Load data
-    master_data = load_master_data()
-    bookings = load_bookings()
-    pending_bookings = load_pending_bookings()
+    directory = load_employee_directory()
+    archive_past_bookings()
+    index = get_booking_index()
+    METRICS.set_gauge("bookings", len(index), "Confirmed bookings in the hot store.")
     
     # Sidebar for login
     with st.sidebar:
@@ -556,7 +1053,7 @@ def main():
             
             if st.button("Login"):
                 if employee_id and password:
-                    is_valid, user_name, is_hr = verify_login(employee_id, password, master_data)
+                    is_valid, user_name, is_hr = verify_login(employee_id, password, directory)
                     
                     if is_valid:
                         st.session_state.logged_in = True
@@ -573,6 +1070,9 @@ def main():
             st.write(f"Logged in as: **{st.session_state.user_name}**")
             st.write(f"Role: **{'HR' if st.session_state.is_hr else 'Employee'}**")
             
+            if st.session_state.is_hr:
+                st.radio("View", ["Bookings", "Analytics", "Diagnostics"], key="hr_view")
+            
             if st.button("Logout"):
                 logout()
                 st.success("Logged out successfully!")
@@ -580,18 +1080,26 @@ def main():
     
     # Main content
     if st.session_state.logged_in:
+        # HR-only analytics and diagnostics pages
+        if st.session_state.is_hr and st.session_state.get("hr_view") == "Analytics":
+            display_analytics()
+            return
+        if st.session_state.is_hr and st.session_state.get("hr_view") == "Diagnostics":
+            display_diagnostics()
+            return
+        
         # Display notifications
-        display_notifications(st.session_state.user_id, pending_bookings, bookings)
+        display_notifications(st.session_state.user_id)
         
         # Display calendar with bookings
-        display_calendar(bookings)
+        display_calendar()
         
         # Display user's bookings
-        display_user_bookings(st.session_state.user_id, bookings)
+        display_user_bookings(st.session_state.user_id, index)
         
         # Book a hall section
         st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-        st.header("Book the Hall")
+        st.header("Book a Hall" if len(HALLS) > 1 else "Book the Hall")
         
         # Booking form with improved layout
         st.markdown("<div class='booking-form'>", unsafe_allow_html=True)
@@ -609,6 +1117,7 @@ def main():
             if new_date != st.session_state.selected_date:
                 st.session_state.selected_date = new_date
                 st.session_state.availability_checked = False
+                st.session_state.free_slots = None
         
         with col2:
             st.write("Select Time")
@@ -636,6 +1145,16 @@ def main():
                     st.session_state.selected_end_time = new_end_time
                     st.session_state.availability_checked = False
         
+        # Hall selection, only shown when there is more than one hall
+        if len(HALLS) > 1:
+            new_hall = st.selectbox(
+                "Hall",
+                HALLS,
+                index=HALLS.index(st.session_state.selected_hall) if st.session_state.selected_hall in HALLS else 0,
+            )
+            if new_hall != st.session_state.selected_hall:
+                update_hall(new_hall)
+        
         # Update session state directly when the purpose input changes
         new_purpose = st.text_area(
             "Purpose of Booking", 
@@ -645,6 +1164,70 @@ def main():
         if new_purpose != st.session_state.booking_purpose:
             st.session_state.booking_purpose = new_purpose
         
+        # Free-slot finder for the selected date and hall
+        with st.expander("Find a free slot"):
+            col_duration, col_from, col_until = st.columns(3)
+            with col_duration:
+                duration = st.number_input("Minimum duration (minutes)", min_value=15, max_value=24 * 60, value=60, step=15)
+            with col_from:
+                work_start = st.time_input("From", value=(datetime.min + timedelta(minutes=WORKING_HOURS[0])).time(), key="finder_from")
+            with col_until:
+                work_end = st.time_input("Until", value=(datetime.min + timedelta(minutes=WORKING_HOURS[1])).time(), key="finder_until")
+            
+            if st.button("Find free slots"):
+                working_hours = (work_start.hour * 60 + work_start.minute, work_end.hour * 60 + work_end.minute)
+                st.session_state.free_slots = (
+                    int(duration),
+                    find_free_slots(st.session_state.selected_date, int(duration), get_booking_index(), st.session_state.selected_hall, working_hours),
+                )
+            
+            if st.session_state.free_slots is not None:
+                slot_duration, free_slots = st.session_state.free_slots
+                if not free_slots:
+                    st.warning("No free slot of that length on this date.")
+                for slot_start, slot_end in free_slots:
+                    label = f"{slot_start.strftime('%H:%M')} - {slot_end.strftime('%H:%M')} (free)"
+                    if st.button(label, key=f"free_slot_{slot_start.isoformat()}"):
+                        select_free_slot(slot_start, slot_duration)
+                        st.rerun()
+        
+        # Recurring booking: check the whole series at once, then book it in one write
+        repeat = st.checkbox("Repeat this booking")
+        if repeat:
+            col_frequency, col_ends, col_limit = st.columns(3)
+            with col_frequency:
+                frequency = st.selectbox("Repeats", ["Daily", "Weekly", "Monthly"], index=1)
+            with col_ends:
+                ends = st.radio("Ends", ["On date", "After"], horizontal=True)
+            with col_limit:
+                if ends == "On date":
+                    until = st.date_input("End date", value=st.session_state.selected_date + timedelta(days=90), min_value=st.session_state.selected_date)
+                    count = None
+                else:
+                    until = None
+                    count = st.number_input("Occurrences", min_value=1, max_value=MAX_SERIES_OCCURRENCES, value=10)
+            
+            if st.button("Check Series"):
+                start_datetime = datetime.combine(st.session_state.selected_date, st.session_state.selected_start_time)
+                end_datetime = datetime.combine(st.session_state.selected_date, st.session_state.selected_end_time)
+                if end_datetime <= start_datetime:
+                    st.error("End time must be after start time!")
+                    st.session_state.series_check = None
+                else:
+                    occurrences = series_occurrences(start_datetime, end_datetime, frequency, until, int(count) if count else None)
+                    st.session_state.series_check = {
+                        'hall': st.session_state.selected_hall,
+                        'occurrences': occurrences,
+                        'statuses': check_series(occurrences, get_booking_index(), st.session_state.selected_hall),
+                    }
+            
+            series = st.session_state.series_check
+            if series is not None:
+                st.dataframe(build_series_report(series['occurrences'], series['statuses']), hide_index=True)
+                available = series['statuses'].count("Available")
+                if st.button(f"Book {available} Available Occurrences", disabled=not available):
+                    book_series()
+        
         # Separate availability check and booking
         col_check, col_book = st.columns(2)
         
@@ -662,17 +1245,42 @@ def main():
                 st.success("This time slot is available! You can proceed with booking.")
             else:
                 st.error("Sorry, this time slot is already booked. Please select another time.")
+                if st.session_state.free_halls:
+                    st.info("These halls are free at that time:")
+                    hall_cols = st.columns(len(st.session_state.free_halls))
+                    for hall_col, free_hall in zip(hall_cols, st.session_state.free_halls):
+                        with hall_col:
+                            if st.button(f"Use {free_hall}", key=f"use_hall_{free_hall}"):
+                                st.session_state.selected_hall = free_hall
+                                st.session_state.is_available = True
+                                st.rerun()
                 
         st.markdown("</div>", unsafe_allow_html=True)
         
         # HR specific sections
         if st.session_state.is_hr:
             st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-            display_hr_section(pending_bookings, bookings)
+            display_hr_section(load_pending_bookings(), index)
             st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
-            display_hr_manage_bookings(bookings)
+            display_bulk_import()
+            display_hr_manage_bookings(get_booking_index())
     else:
         st.info("Please login to use the Hall Booking System.")
 
+# Function to run one rerun of the app, timed span by span for the diagnostics
+# page, and to refresh the Prometheus metrics file now and then
+def run_instrumented():
+    METRICS.increment("reruns", help="Script reruns across all sessions.")
+    METRICS.start_trace()
+    try:
+        with METRICS.span("rerun"):
+            main()
+    finally:
+        st.session_state.last_rerun_trace = METRICS.end_trace()
+        try:
+            METRICS.write_prometheus(METRICS_FILE, METRICS_WRITE_INTERVAL)
+        except OSError:
+            pass
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_instrumented()
\ No newline at end of file
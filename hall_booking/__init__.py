@@ -0,0 +1,15 @@
+# Headless hall booking engine: the booking model, availability indexes,
+# storage backends and employee directory used by the Streamlit app (app.py).
+# Importing it does not load Streamlit or pandas, so it can be used from
+# scripts, cron jobs and the command line (python -m hall_booking).
+from .config import DEFAULT_HALL, HALLS, STORAGE_BACKEND
+from .conflicts import RESOLUTION_POLICIES, PendingConflicts
+from .directory import build_employee_directory, read_directory, verify_login
+from .engine import (archive_finished, check_series, find_free_halls, find_free_slots, is_slot_available,
+                     query_bookings_page, query_requests_page, series_occurrences, submit_bookings)
+from .ical import iter_bookings, iter_calendar
+from .imports import import_bookings, plan_import, read_import_sheet
+from .index import BookingIndex, IntervalIndex, find_batch_conflicts
+from .models import Booking, from_minutes, to_minutes
+from .storage import BookingConflictError, JournalStorage, JsonStorage, SqliteStorage, open_storage
+from .store import SharedBookingStore
@@ -0,0 +1,227 @@
+# Utilization analytics for HR: occupancy by weekday and hour, monthly
+# utilization, approval turnaround, denial rates and top requesters.
+# Aggregates are kept per source and only updated from what changed: the hot
+# store by the bookings added or removed since the last bookings version,
+# archived months when their archive version changes, and decisions from where
+# the last read of the decision log stopped.
+import threading
+
+import numpy as np
+
+from .config import EPOCH, WORKING_HOURS
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# Function to get the fields of a booking that the aggregates depend on
+def aggregate_key(booking):
+    return booking.start, booking.end, booking.hall, str(booking.user_id)
+
+# Additive aggregates over a set of confirmed bookings. Bookings are split at
+# hour boundaries, so each minute is counted in the weekday, hour and month
+# it falls in.
+class BookingAggregates:
+    def __init__(self):
+        # hall -> 7 x 24 array of booked minutes (weekday, hour)
+        self.occupancy = {}
+        # (hall, year, month) -> booked minutes
+        self.monthly = {}
+        # user_id -> [name, bookings, booked minutes]
+        self.requesters = {}
+
+    # Add (sign=1) or remove (sign=-1) a batch of bookings
+    def add(self, bookings, sign=1):
+        if not bookings:
+            return
+        starts = np.fromiter((b.start for b in bookings), np.int64, len(bookings))
+        ends = np.fromiter((b.end for b in bookings), np.int64, len(bookings))
+        halls, hall_codes = np.unique(np.array([b.hall for b in bookings], dtype=object), return_inverse=True)
+
+        # One segment per booking and clock hour it touches
+        first_hours = starts // 60
+        counts = np.maximum((ends - 1) // 60 - first_hours + 1, 0)
+        owners = np.repeat(np.arange(len(bookings)), counts)
+        hours = first_hours[owners] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        minutes = np.minimum(ends[owners], hours * 60 + 60) - np.maximum(starts[owners], hours * 60)
+        segment_halls = hall_codes[owners]
+
+        cells = np.zeros((len(halls), 7, 24), dtype=np.int64)
+        np.add.at(cells, (segment_halls, (hours // 24 + EPOCH.weekday()) % 7, hours % 24), minutes)
+        for code, hall in enumerate(halls.tolist()):
+            self.occupancy[hall] = self.occupancy.get(hall, 0) + sign * cells[code]
+
+        # Minutes since EPOCH are numpy's own datetime64 epoch (1970-01-01)
+        months = (hours * 60).astype('datetime64[m]').astype('datetime64[M]').astype(np.int64)
+        keys, inverse = np.unique(np.stack([segment_halls, months]), axis=1, return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=minutes).astype(np.int64)
+        for (code, month), total in zip(keys.T.tolist(), totals.tolist()):
+            key = (halls[code], 1970 + month // 12, month % 12 + 1)
+            self.monthly[key] = self.monthly.get(key, 0) + sign * total
+            if not self.monthly[key]:
+                del self.monthly[key]
+
+        users, user_codes = np.unique(np.array([str(b.user_id) for b in bookings], dtype=object), return_inverse=True)
+        booking_counts = np.bincount(user_codes, minlength=len(users))
+        booked_minutes = np.bincount(user_codes, weights=ends - starts, minlength=len(users)).astype(np.int64)
+        names = {str(b.user_id): b.booked_by for b in bookings}
+        for user_id, count, total in zip(users.tolist(), booking_counts.tolist(), booked_minutes.tolist()):
+            entry = self.requesters.setdefault(user_id, [names[user_id], 0, 0])
+            entry[1] += sign * count
+            entry[2] += sign * total
+            if sign > 0:
+                entry[0] = names[user_id]
+            if entry[1] <= 0:
+                del self.requesters[user_id]
+
+# Utilization statistics shared by every session of a process, refreshed
+# incrementally from the storage before each report
+class UtilizationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.hot = BookingAggregates()
+        # id -> booking for the hot store as last aggregated
+        self._hot_bookings = {}
+        # (year, month) -> (archive version, BookingAggregates)
+        self.archived = {}
+        self.cursor = 0
+        # One entry per decided request
+        self.decided_at = []
+        self.denied = []
+        self.turnaround = []
+        self.decided_users = []
+        self.decided_halls = []
+
+    # Bring the aggregates up to date. `bookings` and `version` may be passed
+    # when the caller already holds the current confirmed bookings.
+    def refresh(self, storage, bookings=None, version=None):
+        with self._lock:
+            version = storage.bookings_version() if version is None else version
+            if version != self.version:
+                current = {b.id: b for b in (storage.load_bookings() if bookings is None else bookings)}
+                previous = self._hot_bookings
+                removed = [b for booking_id, b in previous.items()
+                           if booking_id not in current or aggregate_key(current[booking_id]) != aggregate_key(b)]
+                added = [b for booking_id, b in current.items()
+                         if booking_id not in previous or aggregate_key(previous[booking_id]) != aggregate_key(b)]
+                self.hot.add(removed, -1)
+                self.hot.add(added)
+                self._hot_bookings = current
+                self.version = version
+
+            months = storage.archived_months()
+            for month in set(self.archived) - set(months):
+                del self.archived[month]
+            for year, month in months:
+                archive_version = storage.archive_version(year, month)
+                cached = self.archived.get((year, month))
+                if cached is None or cached[0] != archive_version:
+                    aggregates = BookingAggregates()
+                    aggregates.add(storage.load_archived(year, month))
+                    self.archived[(year, month)] = (archive_version, aggregates)
+
+            decisions, self.cursor = storage.load_decisions(self.cursor)
+            for request in decisions:
+                self.decided_at.append(request.decided_at)
+                self.denied.append(request.status == 'denied')
+                has_times = request.requested_at is not None and request.decided_at is not None
+                self.turnaround.append(request.decided_at - request.requested_at if has_times else np.nan)
+                self.decided_users.append(str(request.user_id))
+                self.decided_halls.append(request.hall)
+
+    def _parts(self):
+        return [self.hot] + [aggregates for _, aggregates in self.archived.values()]
+
+    # Booked hours by hour of day (rows) and weekday (columns)
+    def occupancy(self, hall=None):
+        import pandas as pd
+        with self._lock:
+            cells = np.zeros((7, 24), dtype=np.int64)
+            for part in self._parts():
+                for part_hall, part_cells in part.occupancy.items():
+                    if hall is None or part_hall == hall:
+                        cells = cells + part_cells
+        return pd.DataFrame(cells.T / 60, index=[f"{hour:02d}:00" for hour in range(24)], columns=WEEKDAYS)
+
+    # Share (%) of each month's weekday working hours that was booked, one column per hall
+    def monthly_utilization(self, hall=None, working_hours=WORKING_HOURS):
+        import pandas as pd
+        with self._lock:
+            monthly = {}
+            for part in self._parts():
+                for key, minutes in part.monthly.items():
+                    if hall is None or key[0] == hall:
+                        monthly[key] = monthly.get(key, 0) + minutes
+        if not monthly:
+            return pd.DataFrame()
+        frame = pd.DataFrame([(hall, f"{year:04d}-{month:02d}", minutes) for (hall, year, month), minutes in monthly.items()],
+                             columns=['Hall', 'Month', 'Minutes'])
+        first_days = pd.to_datetime(frame['Month'] + "-01").to_numpy().astype('datetime64[D]')
+        next_firsts = (first_days.astype('datetime64[M]') + 1).astype('datetime64[D]')
+        capacity = np.busday_count(first_days, next_firsts) * (working_hours[1] - working_hours[0])
+        frame['Utilization'] = (frame['Minutes'] / capacity * 100).round(1)
+        return frame.pivot(index='Month', columns='Hall', values='Utilization').fillna(0).sort_index()
+
+    # Decisions per month: approved, denied, denial rate (%) and median turnaround (hours)
+    def decision_summary(self, hall=None):
+        import pandas as pd
+        with self._lock:
+            frame = pd.DataFrame({
+                'decided_at': self.decided_at, 'denied': self.denied, 'turnaround': self.turnaround, 'hall': self.decided_halls,
+            })
+        if hall is not None:
+            frame = frame[frame['hall'] == hall]
+        frame = frame.dropna(subset=['decided_at'])
+        if frame.empty:
+            return pd.DataFrame()
+        months = frame['decided_at'].astype(np.int64).to_numpy().astype('datetime64[m]').astype('datetime64[M]')
+        frame['Month'] = months.astype(str)
+        frame['denied'] = frame['denied'].astype(int)
+        grouped = frame.groupby('Month')
+        decided = grouped.size()
+        denied = grouped['denied'].sum()
+        return pd.DataFrame({
+            'Approved': decided - denied,
+            'Denied': denied,
+            'Denial rate (%)': (denied / decided * 100).round(1),
+            'Median turnaround (h)': (grouped['turnaround'].median() / 60).round(1),
+        })
+
+    # Overall denial rate (%) and median turnaround (minutes), None when unknown
+    def decision_totals(self, hall=None):
+        with self._lock:
+            denied = np.array(self.denied, dtype=bool)
+            turnaround = np.array(self.turnaround, dtype=float)
+            if hall is not None:
+                selected = np.array(self.decided_halls, dtype=object) == hall
+                denied, turnaround = denied[selected], turnaround[selected]
+        denial_rate = float(denied.mean() * 100) if len(denied) else None
+        known = turnaround[~np.isnan(turnaround)]
+        return denial_rate, (float(np.median(known)) if len(known) else None)
+
+    # Employees with the most confirmed bookings, with their booked hours and denied requests
+    def top_requesters(self, count=10):
+        import pandas as pd
+        with self._lock:
+            requesters = {}
+            for part in self._parts():
+                for user_id, (name, bookings, minutes) in part.requesters.items():
+                    entry = requesters.setdefault(user_id, [name, 0, 0])
+                    entry[1] += bookings
+                    entry[2] += minutes
+            users, denied_counts = np.unique(np.array(self.decided_users, dtype=object)[np.array(self.denied, dtype=bool)],
+                                             return_counts=True) if self.denied else ([], [])
+        if not requesters:
+            return pd.DataFrame()
+        frame = pd.DataFrame([(user_id, name, bookings, round(minutes / 60, 1)) for user_id, (name, bookings, minutes) in requesters.items()],
+                             columns=['Employee ID', 'Name', 'Bookings', 'Booked hours'])
+        frame['Denied requests'] = frame['Employee ID'].map(dict(zip(list(users), list(denied_counts)))).fillna(0).astype(int)
+        return frame.nlargest(count, ['Bookings', 'Booked hours']).reset_index(drop=True)
+
+# Function to summarize how long the current pending requests have waited:
+# (waiting requests, median wait, longest wait) with waits in minutes, or None
+# when no request carries its submission time
+def pending_latency(pending_requests, now):
+    waits = np.array([now - request.requested_at for request in pending_requests if request.requested_at is not None])
+    if not len(waits):
+        return len(pending_requests), None, None
+    return len(pending_requests), float(np.median(waits)), int(waits.max())
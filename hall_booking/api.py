@@ -0,0 +1,346 @@
+# Read-only HTTP API for hall availability, served with asyncio from the same
+# booking data as the web app, e.g.
+#   python -m hall_booking.api --port 8765
+#   GET /availability?date=2025-06-02&start=10:00&end=11:00[&hall=Main Hall]
+#   GET /free-slots?date=2025-06-02&duration=60[&hall=Main Hall][&day_start=09:00&day_end=18:00]
+#   GET /month?year=2025&month=6[&hall=Main Hall]
+#   GET /calendar.ics[?user=1001][&from=2025-06-01][&to=2025-07-01][&hall=Main Hall]
+#   GET /health
+# All requests share one in-memory booking index. The storage's bookings
+# version is checked at most every CHECK_INTERVAL seconds, so the booking files
+# are not read per request; when it changes the index is rebuilt once and every
+# cached response is dropped. Calendar feeds are streamed rather than cached,
+# and carry an ETag and Last-Modified so calendar clients polling them get a
+# 304 until the bookings change.
+import argparse
+import asyncio
+import json
+import sys
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qs, urlsplit
+
+from .config import DEFAULT_HALL, HALLS, STORAGE_BACKEND, WORKING_HOURS
+from .engine import find_free_halls, find_free_slots, is_slot_available
+from .ical import calendar_etag, iter_bookings, iter_calendar
+from .index import BookingIndex
+from .metrics import METRICS
+from .models import booking_interval, to_minutes
+from .storage import open_storage
+
+# How often (seconds) the storage is asked whether the bookings changed
+CHECK_INTERVAL = 0.5
+
+# Most response bodies kept between two bookings changes
+MAX_CACHED_RESPONSES = 10000
+
+# Largest request head accepted, and how long an idle keep-alive connection stays open
+MAX_HEADER_BYTES = 16 * 1024
+KEEP_ALIVE_TIMEOUT = 15
+
+# Size of each chunk of a streamed calendar feed
+STREAM_CHUNK_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+# Raised for a request that cannot be answered; becomes an error response
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# The booking index shared by all requests, plus cached response bodies.
+# Both are replaced together when the storage reports a new bookings version.
+class SharedIndex:
+    def __init__(self, storage, check_interval=CHECK_INTERVAL):
+        self.storage = storage
+        self.check_interval = check_interval
+        self.index = None
+        self.version = None
+        self.modified = None
+        self.responses = {}
+        self.archived = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    # The current index, rebuilt off the event loop when the bookings changed
+    async def get(self):
+        if self.index is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self.index
+        async with self._lock:
+            if self.index is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self.index
+            version = await asyncio.to_thread(self.storage.bookings_version)
+            if self.index is None or version != self.version:
+                bookings = await asyncio.to_thread(self.storage.load_bookings)
+                self.index = BookingIndex(bookings)
+                self.version = version
+                # Whole seconds, as HTTP dates carry no more
+                self.modified = int(time.time())
+                self.responses = {}
+                METRICS.increment("api_index_rebuilds", help="Booking index rebuilds in the availability API.")
+            self._checked_at = time.monotonic()
+            return self.index
+
+    # Archived bookings of a month bucketed by day, cached per archive version
+    async def archived_month(self, year, month):
+        archive_version = await asyncio.to_thread(self.storage.archive_version, year, month)
+        cached = self.archived.get((year, month))
+        if cached is None or cached[0] != archive_version:
+            bookings = await asyncio.to_thread(self.storage.load_archived, year, month)
+            cached = (archive_version, BookingIndex(bookings).month_bookings(year, month))
+            self.archived[(year, month)] = cached
+        return cached[1]
+
+# Function to read one query parameter, parsed with `parse`
+def get_param(params, name, parse=str, default=None):
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise ApiError(400, f"Missing parameter '{name}'.")
+        return default
+    try:
+        return parse(values[0])
+    except ValueError:
+        raise ApiError(400, f"Invalid value for '{name}': {values[0]!r}.")
+
+# Function to parse a YYYY-MM-DD date
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+# Function to parse an HH:MM time into minutes after midnight
+def parse_time(value):
+    parsed = datetime.strptime(value, "%H:%M")
+    return parsed.hour * 60 + parsed.minute
+
+# Function to read the optional hall parameter
+def get_hall(params, default=None):
+    hall = get_param(params, "hall", default=default or "")
+    if hall and hall not in HALLS:
+        raise ApiError(400, f"Unknown hall {hall!r}.")
+    return hall or None
+
+# Function to describe a booking for a response; no purposes are exposed
+def booking_summary(booking):
+    return {
+        'id': booking.id,
+        'hall': booking.hall,
+        'start': booking.start_datetime.strftime("%Y-%m-%d %H:%M"),
+        'end': booking.end_datetime.strftime("%Y-%m-%d %H:%M"),
+        'booked_by': booking.booked_by,
+    }
+
+async def handle_availability(shared, params):
+    day = datetime.combine(get_param(params, "date", parse_date), datetime.min.time())
+    start_datetime = day + timedelta(minutes=get_param(params, "start", parse_time))
+    end_datetime = day + timedelta(minutes=get_param(params, "end", parse_time))
+    if end_datetime <= start_datetime:
+        raise ApiError(400, "'end' must be after 'start'.")
+    hall = get_hall(params)
+    index = await shared.get()
+    if hall:
+        return {'hall': hall, 'free': is_slot_available(start_datetime, end_datetime, index, hall)}
+    return {'free_halls': find_free_halls(start_datetime, end_datetime, index)}
+
+async def handle_free_slots(shared, params):
+    date = get_param(params, "date", parse_date)
+    duration = get_param(params, "duration", int)
+    if duration <= 0:
+        raise ApiError(400, "'duration' must be positive.")
+    working_hours = (get_param(params, "day_start", parse_time, WORKING_HOURS[0]),
+                     get_param(params, "day_end", parse_time, WORKING_HOURS[1]))
+    hall = get_hall(params, DEFAULT_HALL)
+    index = await shared.get()
+    slots = find_free_slots(date, duration, index, hall, working_hours)
+    return {'hall': hall, 'slots': [{'start': start.strftime("%H:%M"), 'end': end.strftime("%H:%M")} for start, end in slots]}
+
+async def handle_month(shared, params):
+    year = get_param(params, "year", int)
+    month = get_param(params, "month", int)
+    if not 1 <= year <= 9999:
+        raise ApiError(400, "'year' must be between 1 and 9999.")
+    if not 1 <= month <= 12:
+        raise ApiError(400, "'month' must be between 1 and 12.")
+    hall = get_hall(params)
+    index = await shared.get()
+    month_bookings = dict(index.month_bookings(year, month, hall))
+    today = datetime.now().date()
+    if (year, month) <= (today.year, today.month):
+        for day, day_bookings in (await shared.archived_month(year, month)).items():
+            if hall:
+                day_bookings = [b for b in day_bookings if b.hall == hall]
+            if day_bookings:
+                month_bookings[day] = sorted(day_bookings + month_bookings.get(day, []), key=booking_interval)
+    return {
+        'year': year,
+        'month': month,
+        'days': {str(day): [booking_summary(b) for b in day_bookings] for day, day_bookings in sorted(month_bookings.items())},
+    }
+
+# Function to pull chunks from a calendar generator until about STREAM_CHUNK_BYTES
+def next_chunk(chunks):
+    parts = []
+    size = 0
+    for part in chunks:
+        parts.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            break
+    return "".join(parts).encode()
+
+# Function to answer a calendar feed; returns (status, headers, body) where the
+# body is an async iterator of chunks, or b"" when the client's copy is current.
+# Purposes are left out, as in every other response.
+async def handle_calendar(shared, params, request_headers):
+    user_id = get_param(params, "user", default="") or None
+    start = get_param(params, "from", parse_date, "")
+    end = get_param(params, "to", parse_date, "")
+    start = to_minutes(datetime.combine(start, datetime.min.time())) if start else None
+    end = to_minutes(datetime.combine(end, datetime.min.time())) if end else None
+    hall = get_hall(params)
+    index = await shared.get()
+
+    headers = {
+        'Content-Type': 'text/calendar; charset=utf-8',
+        'ETag': calendar_etag(shared.version, user_id, start, end, hall),
+        'Last-Modified': formatdate(shared.modified, usegmt=True),
+        'Cache-Control': 'no-cache',
+    }
+    if 'if-none-match' in request_headers:
+        if headers['ETag'] in [tag.strip() for tag in request_headers['if-none-match'].split(",")]:
+            return 304, headers, b""
+    elif 'if-modified-since' in request_headers:
+        try:
+            since = parsedate_to_datetime(request_headers['if-modified-since']).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and since >= shared.modified:
+            return 304, headers, b""
+
+    name = f"{hall or 'Hall'} bookings" + (f" for {user_id}" if user_id else "")
+    stamp = datetime.fromtimestamp(shared.modified, timezone.utc)
+    chunks = iter_calendar(iter_bookings(shared.storage, index, user_id, start, end, hall), name, stamp, purposes=False)
+
+    # Archived months are read from disk, so chunks are produced off the event loop
+    async def stream():
+        while True:
+            chunk = await asyncio.to_thread(next_chunk, chunks)
+            if not chunk:
+                return
+            yield chunk
+    return 200, headers, stream()
+
+async def handle_health(shared, params):
+    await shared.get()
+    return {'status': 'ok', 'bookings': len(shared.index), 'halls': HALLS}
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+ROUTES = {
+    '/availability': handle_availability,
+    '/free-slots': handle_free_slots,
+    '/month': handle_month,
+    '/health': handle_health,
+}
+
+# Function to answer one request; returns (status, headers, body), where the
+# body is bytes or, for a streamed feed, an async iterator of chunks.
+# Successful JSON responses are cached until the bookings change.
+async def respond(shared, method, target, request_headers):
+    if method != "GET":
+        raise ApiError(405, "Only GET is supported.")
+    url = urlsplit(target)
+    if url.path == '/calendar.ics':
+        return await handle_calendar(shared, parse_qs(url.query), request_headers)
+    handler = ROUTES.get(url.path)
+    if handler is None:
+        raise ApiError(404, f"Unknown path {url.path!r}.")
+    await shared.get()
+    cached = shared.responses.get(target)
+    if cached is not None:
+        return 200, JSON_HEADERS, cached
+    body = json.dumps(await handler(shared, parse_qs(url.query))).encode()
+    # Responses that depend on the current time (free slots skip the past) are not cached
+    if url.path in ('/availability', '/month'):
+        if len(shared.responses) >= MAX_CACHED_RESPONSES:
+            shared.responses = {}
+        shared.responses[target] = body
+    return 200, JSON_HEADERS, body
+
+# Function to serve requests on one connection until it is closed
+async def handle_connection(shared, reader, writer):
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            lines = head.decode('latin-1').split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ", 2)
+            except ValueError:
+                return
+            headers = dict(line.split(":", 1) for line in lines[1:] if ":" in line)
+            headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == "HTTP/1.1"
+
+            started = time.perf_counter()
+            try:
+                status, response_headers, body = await respond(shared, method, target, headers)
+            except ApiError as error:
+                status, response_headers, body = error.status, JSON_HEADERS, json.dumps({'error': str(error)}).encode()
+            except Exception:
+                # The details go to the server log, not to the client
+                traceback.print_exc()
+                status, response_headers, body = 500, JSON_HEADERS, json.dumps({'error': "Internal server error."}).encode()
+
+            head = f"HTTP/1.1 {status} {REASONS[status]}\r\n" + "".join(f"{name}: {value}\r\n" for name, value in response_headers.items())
+            if isinstance(body, bytes):
+                writer.write(
+                    f"{head}Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+            else:
+                # Streamed: chunked for HTTP/1.1, otherwise until the connection closes
+                chunked = version == "HTTP/1.1"
+                if chunked:
+                    head += "Transfer-Encoding: chunked\r\n"
+                writer.write(f"{head}Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode())
+                async for chunk in body:
+                    writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+                    await writer.drain()
+                if chunked:
+                    writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+            METRICS.observe("api.request", time.perf_counter() - started)
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+async def serve(storage, host, port):
+    shared = SharedIndex(storage)
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(shared, reader, writer), host, port,
+                                        limit=MAX_HEADER_BYTES, backlog=1024)
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    print(f"Serving hall availability on {addresses}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hall_booking.api", description="Read-only hall availability API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--storage", choices=["json", "sqlite", "journal"], default=STORAGE_BACKEND)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(open_storage(args.storage), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
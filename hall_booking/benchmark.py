@@ -0,0 +1,230 @@
+# Benchmarks for the booking engine over synthetic booking histories, e.g.
+#   python -m hall_booking.benchmark --sizes 1000 10000 100000 --output bench.json
+#   python -m hall_booking.benchmark --sizes 1000 --compare bench.json
+# Every size is generated from the same seed, so runs on different versions
+# time the same data. Results are written as JSON; --compare prints the ratio
+# of each timing to a previous results file.
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .config import HALLS, MINUTES_PER_DAY
+from .conflicts import PendingConflicts
+from .directory import build_employee_directory, verify_login
+from .engine import is_slot_available, query_bookings_page
+from .index import BookingIndex
+from .models import Booking, from_minutes, to_minutes
+from .storage import JournalStorage, JsonStorage, SqliteStorage, write_booking_file
+
+# Booking sizes run by default; 1M is available with --sizes but takes minutes
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Slot starts offered each day (minutes after midnight) and booking lengths
+SLOT_STARTS = np.arange(9 * 60, 17 * 60 + 1, 60)
+DURATIONS = np.array([30, 60])
+
+# Share of slots that are booked, and pending requests per confirmed booking
+OCCUPANCY = 0.7
+PENDING_RATIO = 0.1
+
+# Function to generate `count` confirmed bookings that do not overlap, plus
+# count * PENDING_RATIO pending requests in the weeks after `today`. Bookings
+# fill the halls' daily slots backwards from two months after `today`, so
+# larger histories reach further into the past.
+def generate_history(count, seed, today, halls=HALLS, employees=1000):
+    rng = np.random.default_rng(seed)
+    horizon = to_minutes(datetime.combine(today + timedelta(days=60), datetime.min.time()))
+    slots_per_day = len(SLOT_STARTS) * len(halls)
+
+    # Enough candidate slots to keep OCCUPANCY of them, walking back day by day
+    candidates = int(count / OCCUPANCY) + slots_per_day
+    taken = np.flatnonzero(rng.random(candidates) < OCCUPANCY)
+    while len(taken) < count:
+        candidates *= 2
+        taken = np.flatnonzero(rng.random(candidates) < OCCUPANCY)
+    taken = taken[:count]
+    days, rest = np.divmod(taken, slots_per_day)
+    hall_numbers, slot_numbers = np.divmod(rest, len(SLOT_STARTS))
+    starts = horizon - (days + 1) * MINUTES_PER_DAY + SLOT_STARTS[slot_numbers]
+    ends = starts + rng.choice(DURATIONS, count)
+    users = rng.integers(1, employees + 1, count)
+
+    bookings = [
+        Booking(str(user), f"Employee {user}", int(start), int(end), "Team meeting", 'approved', True, hall=halls[hall])
+        for user, start, end, hall in zip(users.tolist(), starts.tolist(), ends.tolist(), hall_numbers.tolist())
+    ]
+    bookings.sort(key=lambda booking: booking.start)
+
+    pending_count = int(count * PENDING_RATIO)
+    today_start = to_minutes(datetime.combine(today, datetime.min.time()))
+    pending_starts = today_start + rng.integers(1, 29, pending_count) * MINUTES_PER_DAY + rng.choice(SLOT_STARTS, pending_count)
+    pending_users = rng.integers(1, employees + 1, pending_count)
+    pending = [
+        Booking(str(user), f"Employee {user}", int(start), int(start) + 60, "Workshop", hall=halls[0])
+        for user, start in zip(pending_users.tolist(), pending_starts.tolist())
+    ]
+    return bookings, pending
+
+# Function to generate a master sheet (as a DataFrame) with `count` employees
+def generate_master_data(count, seed):
+    import pandas as pd
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "Employee_ID": range(1, count + 1),
+        "Employee_Name": [f"Employee {i}" for i in range(1, count + 1)],
+        "Password": [f"pw{rng.randrange(10 ** 6):06d}" for _ in range(count)],
+        "Role": ["HR" if i % 50 == 0 else "Employee" for i in range(1, count + 1)],
+    })
+
+# Function to create a backend in `directory` holding the given history
+def create_storage(backend, directory, bookings, pending):
+    bookings_file = os.path.join(directory, "bookings.json")
+    pending_file = os.path.join(directory, "pending_bookings.json")
+    write_booking_file(bookings_file, bookings)
+    write_booking_file(pending_file, pending)
+    archive_dir = os.path.join(directory, "archive")
+    if backend == "json":
+        return lambda: JsonStorage(bookings_file, pending_file, archive_dir, os.path.join(directory, "notifications.json"),
+                                   os.path.join(directory, "decisions.jsonl"))
+    if backend == "sqlite":
+        path = os.path.join(directory, "bookings.db")
+        SqliteStorage(path, bookings_file, pending_file)
+        return lambda: SqliteStorage(path)
+    if backend == "journal":
+        snapshot_file = os.path.join(directory, "snapshot.json")
+        prefix = os.path.join(directory, "journal")
+        decisions_file = os.path.join(directory, "decisions.jsonl")
+        JournalStorage(snapshot_file, prefix, bookings_file, pending_file, archive_dir=archive_dir, decisions_file=decisions_file)
+        return lambda: JournalStorage(snapshot_file, prefix, archive_dir=archive_dir, decisions_file=decisions_file)
+    raise ValueError(f"Unknown storage backend {backend!r}")
+
+# Function to time `operation` `repeat` times and return the fastest run in seconds
+def best_of(operation, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+# Function to run every benchmark for one backend and history size.
+# Returns {name: seconds}; per-query benchmarks report the time for `queries` calls.
+def run_size(backend, size, seed, repeat, queries, today):
+    bookings, pending = generate_history(size, seed, today)
+    directory = tempfile.mkdtemp(prefix="hall_booking_bench_")
+    try:
+        open_storage = create_storage(backend, directory, bookings, pending)
+        results = {}
+        # A fresh storage object each time, so the journal replays from disk
+        results['load_bookings'] = best_of(lambda: open_storage().load_bookings(), repeat)
+        storage = open_storage()
+        loaded = storage.load_bookings()
+        results['load_pending_bookings'] = best_of(storage.load_pending_bookings, repeat)
+        results['save_bookings'] = best_of(lambda: storage.save_bookings(loaded), repeat)
+        results['build_index'] = best_of(lambda: BookingIndex(loaded), repeat)
+
+        index = BookingIndex(loaded)
+        rng = random.Random(seed)
+        first, last = index.by_start[0].start, index.by_start[-1].end
+        slots = []
+        for _ in range(queries):
+            start = rng.randrange(first, last)
+            slots.append((from_minutes(start), from_minutes(start + 60)))
+        results['is_slot_available'] = best_of(lambda: [is_slot_available(start, end, index, HALLS[0]) for start, end in slots], repeat)
+
+        # display_calendar: one month's bookings bucketed by day, for the 12 months before today
+        months = [((today.year * 12 + today.month - 1 - back) // 12, (today.month - 1 - back) % 12 + 1) for back in range(12)]
+        results['calendar_month_bookings'] = best_of(lambda: [index.month_bookings(year, month) for year, month in months], repeat)
+
+        # display_hr_manage_bookings: first page of upcoming, past, and past filtered by employee
+        now = to_minutes(datetime.combine(today, datetime.min.time()))
+        results['hr_page_upcoming'] = best_of(lambda: query_bookings_page(index, now, None), repeat)
+        results['hr_page_past'] = best_of(lambda: query_bookings_page(index, None, now, newest_first=True), repeat)
+        results['hr_page_employee'] = best_of(lambda: query_bookings_page(index, None, now, "Employee 42", True), repeat)
+        results['hr_page_employee_id'] = best_of(lambda: query_bookings_page(index, None, now, "42", True), repeat)
+
+        # display_user_bookings: one user's bookings from the per-user index
+        users = [str(rng.randrange(1, 1001)) for _ in range(queries)]
+        results['user_bookings'] = best_of(lambda: [index.user_bookings(user) for user in users], repeat)
+
+        # display_hr_section: conflict clusters of the pending queue and the first-come resolution
+        pending_loaded = storage.load_pending_bookings()
+        results['pending_conflicts'] = best_of(lambda: PendingConflicts(pending_loaded, index).resolve(), repeat)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# Function to time building the login directory from a master sheet and
+# `queries` logins against it
+def run_directory(employees, seed, repeat, queries):
+    master_data = generate_master_data(employees, seed)
+    directory = build_employee_directory(master_data)
+    rng = random.Random(seed)
+    logins = [(str(rng.randrange(1, employees + 1)), "wrong") for _ in range(queries)]
+    return {
+        'build_employee_directory': best_of(lambda: build_employee_directory(master_data), repeat),
+        'verify_login': best_of(lambda: [verify_login(user, password, directory) for user, password in logins], repeat),
+    }
+
+# Function to print each timing next to the same timing in a previous results file
+def compare(results, previous):
+    old = {(r['backend'], r['size'], r['name']): r['seconds'] for r in previous['results']}
+    for result in results['results']:
+        key = (result['backend'], result['size'], result['name'])
+        line = f"{result['backend']:8} {result['size']:>8} {result['name']:26} {result['seconds'] * 1000:10.3f} ms"
+        if key in old and old[key] > 0:
+            line += f"  {result['seconds'] / old[key]:6.2f}x"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hall_booking.benchmark", description="Benchmark the booking engine.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of confirmed bookings")
+    parser.add_argument("--backends", nargs="+", choices=["json", "sqlite", "journal"], default=["json", "sqlite", "journal"])
+    parser.add_argument("--employees", type=int, default=100000, help="rows in the synthetic master sheet")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the fastest is kept")
+    parser.add_argument("--queries", type=int, default=1000, help="calls per query benchmark")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    # A fixed date keeps the generated data identical between runs
+    today = datetime(2025, 1, 1).date()
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'queries': args.queries,
+        'results': [],
+    }
+    for name, seconds in run_directory(args.employees, args.seed, args.repeat, args.queries).items():
+        results['results'].append({'backend': 'directory', 'size': args.employees, 'name': name, 'seconds': seconds})
+    for backend in args.backends:
+        for size in args.sizes:
+            for name, seconds in run_size(backend, size, args.seed, args.repeat, args.queries, today).items():
+                results['results'].append({'backend': backend, 'size': size, 'name': name, 'seconds': seconds})
+            print(f"{backend} {size}: done", file=sys.stderr)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            previous = json.load(file)
+    compare(results, previous or {'results': []})
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# Command line interface for scripted checks and bulk operations, e.g.
+#   python -m hall_booking check 2025-06-02 10:00 11:00 --hall "Main Hall"
+#   python -m hall_booking approve --all
+#   python -m hall_booking resolve --policy shortest --dry-run
+#   python -m hall_booking export-ics --user 1001 --output bookings.ics
+#   python -m hall_booking import term_bookings.xlsx --report rejected.csv
+# Exit status is 0 on success, 1 when a check finds the slot taken or some
+# operation was rejected, and 2 on bad input.
+import argparse
+import sys
+from datetime import datetime
+
+from .conflicts import RESOLUTION_POLICIES, PendingConflicts
+from .config import DEFAULT_HALL, HALLS, MASTER_FILE, STORAGE_BACKEND
+from .directory import read_directory
+from .engine import archive_finished, find_free_halls, find_free_slots, is_slot_available, submit_bookings
+from .ical import iter_bookings, iter_calendar
+from .imports import import_bookings, plan_import, read_import_sheet, rejection_report
+from .index import BookingIndex
+from .models import Booking, to_minutes
+from .storage import BookingConflictError, file_signature, open_storage
+
+# Function to parse a date and a HH:MM time into a datetime
+def parse_datetime(date, time):
+    return datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+
+# Function to describe a booking on one line
+def describe(booking):
+    return (f"{booking.id}  {booking.start_datetime.strftime('%d-%m-%Y %H:%M')}-{booking.end_datetime.strftime('%H:%M')}  "
+            f"{booking.hall}  {booking.booked_by}  {booking.purpose or ''}").rstrip()
+
+# Function to pick requests by id, or every one of them with --all
+def select_requests(requests, ids, select_all):
+    if select_all:
+        return list(requests)
+    by_id = {request.id: request for request in requests}
+    missing = [request_id for request_id in ids if request_id not in by_id]
+    if missing:
+        raise ValueError(f"Unknown request id(s): {', '.join(missing)}")
+    return [by_id[request_id] for request_id in ids]
+
+def command_check(storage, args):
+    start, end = parse_datetime(args.date, args.start), parse_datetime(args.date, args.end)
+    index = BookingIndex(storage.load_bookings())
+    if args.hall:
+        free = is_slot_available(start, end, index, args.hall)
+        print(f"{args.hall}: {'free' if free else 'booked'}")
+        return 0 if free else 1
+    free_halls = find_free_halls(start, end, index)
+    for hall in HALLS:
+        print(f"{hall}: {'free' if hall in free_halls else 'booked'}")
+    return 0 if free_halls else 1
+
+def command_free_slots(storage, args):
+    date = datetime.strptime(args.date, "%Y-%m-%d").date()
+    working_hours = tuple(to_minutes(parse_datetime("1970-01-01", value)) for value in (args.day_start, args.day_end))
+    slots = find_free_slots(date, args.duration, BookingIndex(storage.load_bookings()), args.hall, working_hours)
+    for start, end in slots:
+        print(f"{start.strftime('%H:%M')}-{end.strftime('%H:%M')}")
+    return 0 if slots else 1
+
+def command_book(storage, args):
+    booking = Booking(args.user_id, args.name, to_minutes(parse_datetime(args.date, args.start)),
+                      to_minutes(parse_datetime(args.date, args.end)), args.purpose, hall=args.hall)
+    if booking.end <= booking.start:
+        raise ValueError("End time must be after start time.")
+    submit_bookings(storage, [booking], auto_approve=args.approve)
+    print(describe(booking))
+    return 0
+
+def command_pending(storage, args):
+    for request in storage.load_pending_bookings():
+        print(describe(request))
+    return 0
+
+def command_decide(storage, args):
+    requests = select_requests(storage.load_pending_bookings(), args.ids, args.all)
+    approvals, denials = (requests, []) if args.command == "approve" else ([], requests)
+    approved, denied, skipped = storage.decide(approvals, denials)
+    print(f"Approved {len(approved)}, denied {len(denied)}, skipped {len(skipped)}.")
+    for request, reason in skipped:
+        print(f"Skipped {request.id}: {reason}", file=sys.stderr)
+    return 1 if skipped else 0
+
+def command_resolve(storage, args):
+    conflicts = PendingConflicts(storage.load_pending_bookings(), BookingIndex(storage.load_bookings()))
+    directory = read_directory(file_signature(MASTER_FILE)) if args.policy == "priority" else None
+    losers = conflicts.resolve(args.policy, directory)
+    for request, reason in losers:
+        print(f"{describe(request)}  -- {reason}")
+    if args.dry_run:
+        print(f"Would deny {len(losers)} request(s).")
+        return 0
+    _, denied, skipped = storage.decide([], [request for request, _ in losers])
+    print(f"Denied {len(denied)}, skipped {len(skipped)}.")
+    for request, reason in skipped:
+        print(f"Skipped {request.id}: {reason}", file=sys.stderr)
+    return 1 if skipped else 0
+
+def command_cancel(storage, args):
+    bookings = select_requests(storage.load_bookings(), args.ids, False)
+    failed = 0
+    for booking in bookings:
+        try:
+            storage.cancel_booking(booking)
+        except BookingConflictError as error:
+            print(f"{booking.id}: {error}", file=sys.stderr)
+            failed += 1
+    print(f"Cancelled {len(bookings) - failed} booking(s).")
+    return 1 if failed else 0
+
+def command_archive(storage, args):
+    print(f"Archived {archive_finished(storage)} booking(s).")
+    return 0
+
+def command_export_ics(storage, args):
+    start = to_minutes(datetime.strptime(args.start, "%Y-%m-%d")) if args.start else None
+    end = to_minutes(datetime.strptime(args.end, "%Y-%m-%d")) if args.end else None
+    bookings = iter_bookings(storage, BookingIndex(storage.load_bookings()), args.user, start, end, args.hall)
+    name = f"{args.hall or 'Hall'} bookings" + (f" for {args.user}" if args.user else "")
+    # Written as it is generated; newline='' keeps the CRLF line endings iCalendar requires
+    file = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for chunk in iter_calendar(bookings, name):
+            file.write(chunk)
+    finally:
+        if args.output:
+            file.close()
+    return 0
+
+def command_import(storage, args):
+    directory = read_directory(file_signature(MASTER_FILE))
+    if not directory:
+        raise ValueError(f"Master file {MASTER_FILE} not found or empty.")
+    bookings, rejections = plan_import(read_import_sheet(args.sheet), directory, BookingIndex(storage.load_bookings()))
+    if not args.dry_run:
+        import_bookings(storage, bookings)
+    print(f"{'Would import' if args.dry_run else 'Imported'} {len(bookings)} booking(s), rejected {len(rejections)}.")
+    for row, reason in zip(rejections['Row'].tolist(), rejections['Reason'].tolist()):
+        print(f"Row {row}: {reason}", file=sys.stderr)
+    if args.report and len(rejections):
+        with open(args.report, 'wb') as file:
+            file.write(rejection_report(rejections))
+    return 1 if len(rejections) else 0
+
+# Function to build the argument parser
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m hall_booking", description="Hall booking command line tools.")
+    parser.add_argument("--storage", choices=["json", "sqlite", "journal"], default=STORAGE_BACKEND,
+                        help="storage backend (default: HALL_BOOKING_STORAGE or json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    check = commands.add_parser("check", help="check whether a slot is free")
+    check.add_argument("date", help="YYYY-MM-DD")
+    check.add_argument("start", help="HH:MM")
+    check.add_argument("end", help="HH:MM")
+    check.add_argument("--hall", choices=HALLS, help="hall to check (default: every hall)")
+    check.set_defaults(handler=command_check)
+
+    free_slots = commands.add_parser("free-slots", help="list free slots on a day")
+    free_slots.add_argument("date", help="YYYY-MM-DD")
+    free_slots.add_argument("duration", type=int, help="minutes")
+    free_slots.add_argument("--hall", choices=HALLS, default=DEFAULT_HALL)
+    free_slots.add_argument("--day-start", default="09:00", help="HH:MM (default: 09:00)")
+    free_slots.add_argument("--day-end", default="18:00", help="HH:MM (default: 18:00)")
+    free_slots.set_defaults(handler=command_free_slots)
+
+    book = commands.add_parser("book", help="request a booking, or confirm it with --approve")
+    book.add_argument("user_id")
+    book.add_argument("name")
+    book.add_argument("date", help="YYYY-MM-DD")
+    book.add_argument("start", help="HH:MM")
+    book.add_argument("end", help="HH:MM")
+    book.add_argument("--hall", choices=HALLS, default=DEFAULT_HALL)
+    book.add_argument("--purpose")
+    book.add_argument("--approve", action="store_true", help="confirm straight away instead of queueing for HR")
+    book.set_defaults(handler=command_book)
+
+    pending = commands.add_parser("pending", help="list requests waiting for a decision")
+    pending.set_defaults(handler=command_pending)
+
+    for name in ("approve", "deny"):
+        decide = commands.add_parser(name, help=f"{name} pending requests in one write")
+        decide.add_argument("ids", nargs="*", help="request ids")
+        decide.add_argument("--all", action="store_true", help=f"{name} every pending request")
+        decide.set_defaults(handler=command_decide)
+
+    resolve = commands.add_parser("resolve", help="deny the pending requests that lose their conflicts")
+    resolve.add_argument("--policy", choices=list(RESOLUTION_POLICIES), default="first-come",
+                         help="which overlapping request keeps the slot (default: first-come)")
+    resolve.add_argument("--dry-run", action="store_true", help="list the requests without denying them")
+    resolve.set_defaults(handler=command_resolve)
+
+    cancel = commands.add_parser("cancel", help="cancel confirmed bookings")
+    cancel.add_argument("ids", nargs="+", help="booking ids")
+    cancel.set_defaults(handler=command_cancel)
+
+    archive = commands.add_parser("archive", help="move finished bookings into the monthly archive")
+    archive.set_defaults(handler=command_archive)
+
+    export_ics = commands.add_parser("export-ics", help="export confirmed bookings as an iCalendar file")
+    export_ics.add_argument("--user", help="only this employee's bookings")
+    export_ics.add_argument("--from", dest="start", help="YYYY-MM-DD, first day included")
+    export_ics.add_argument("--to", dest="end", help="YYYY-MM-DD, first day not included")
+    export_ics.add_argument("--hall", choices=HALLS)
+    export_ics.add_argument("--output", help="file to write (default: standard output)")
+    export_ics.set_defaults(handler=command_export_ics)
+
+    import_sheet = commands.add_parser("import", help="confirm the bookings of an Excel/CSV sheet in one write")
+    import_sheet.add_argument("sheet", help="Excel or CSV file with Employee_ID, Date, Start_Time, End_Time[, Purpose, Hall]")
+    import_sheet.add_argument("--report", help="write the rejected rows with their reasons to this CSV file")
+    import_sheet.add_argument("--dry-run", action="store_true", help="check the sheet without importing anything")
+    import_sheet.set_defaults(handler=command_import)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(open_storage(args.storage), args)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 2
+    except BookingConflictError as error:
+        print(error, file=sys.stderr)
+        return 1
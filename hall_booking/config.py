@@ -0,0 +1,48 @@
+# Settings shared by the web app, the CLI and scripts
+import os
+from datetime import datetime
+
+# File paths
+MASTER_FILE = r"D:\\Downloads\\master_data.xlsx"
+MASTER_CACHE_FILE = MASTER_FILE + ".directory.pkl"
+BOOKINGS_FILE = "bookings.json"
+PENDING_FILE = "pending_bookings.json"
+NOTIFICATIONS_FILE = "notifications.json"
+DECISIONS_FILE = "booking_decisions.jsonl"
+SQLITE_FILE = "hall_booking.db"
+JOURNAL_SNAPSHOT_FILE = "bookings_snapshot.json"
+JOURNAL_PREFIX = "bookings_journal"
+ARCHIVE_DIR = "booking_archive"
+
+# Storage backend for bookings and pending requests: "json", "sqlite" or "journal"
+STORAGE_BACKEND = os.environ.get("HALL_BOOKING_STORAGE", "json")
+
+# Halls that can be booked, e.g. HALL_BOOKING_HALLS="Main Hall,Board Room".
+# Bookings made before halls existed belong to the first one.
+HALLS = [hall.strip() for hall in os.environ.get("HALL_BOOKING_HALLS", "Main Hall").split(",") if hall.strip()]
+DEFAULT_HALL = HALLS[0]
+
+# Number of bookings per page in the HR "Manage Existing Bookings" view
+HR_PAGE_SIZE = 20
+
+# How long a write waits for another session's write to finish (seconds)
+STORAGE_LOCK_TIMEOUT = 10
+
+# Upper bound on the number of occurrences in one recurring booking
+MAX_SERIES_OCCURRENCES = 366
+
+# Default working hours for the free-slot finder, in minutes after midnight
+WORKING_HOURS = (9 * 60, 18 * 60)
+
+# Journal size (bytes) after which it is folded into a new snapshot
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# Date/time format used in the booking files and the epoch used for minute offsets
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+EPOCH = datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+
+# Prometheus text file with the app's timings and counters, and how often it is
+# rewritten (seconds)
+METRICS_FILE = os.environ.get("HALL_BOOKING_METRICS_FILE", "hall_booking_metrics.prom")
+METRICS_WRITE_INTERVAL = 15
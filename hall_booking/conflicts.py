@@ -0,0 +1,119 @@
+# Conflicts in the pending queue. Requests are grouped per hall by one sweep
+# over the queue sorted by start: a request joins the current cluster while it
+# starts before the latest end seen so far, so each cluster is a connected
+# group of overlapping requests. Overlap counts come from bisecting the sorted
+# starts and ends, and requests whose slot is already confirmed for someone
+# else are found with one index lookup each, so nothing compares every pair.
+from bisect import bisect_left, bisect_right
+
+from .index import IntervalIndex
+from .models import booking_interval
+
+# Function to order requests by submission; requests from before submission
+# times were recorded come last
+def first_come_key(request, directory=None):
+    return request.requested_at is None, request.requested_at or 0, request.start, request.id
+
+# Function to order requests from HR staff first, then by submission
+def priority_key(request, directory=None):
+    entry = (directory or {}).get(str(request.user_id))
+    return not (entry is not None and entry[2]), first_come_key(request)
+
+# Function to order requests by duration, then by submission
+def shortest_key(request, directory=None):
+    return request.end - request.start, first_come_key(request)
+
+# Policies for deciding which request of a cluster keeps its slot
+RESOLUTION_POLICIES = {
+    "first-come": first_come_key,
+    "priority": priority_key,
+    "shortest": shortest_key,
+}
+
+# Conflict clusters of a pending queue against the confirmed bookings in `index`
+class PendingConflicts:
+    def __init__(self, requests, index):
+        # Clusters of two or more overlapping requests, each sorted by start
+        self.clusters = []
+        # request id -> (cluster, position in it) for requests in a cluster
+        self.positions = {}
+        # request id -> number of other pending requests it overlaps
+        self.overlap_counts = {}
+        # request id -> request, for requests overlapping a confirmed booking
+        self.blocked = {request.id: request for request in requests
+                        if index.overlaps(request.start, request.end, request.hall)}
+        self._prefix_max_ends = []
+
+        by_hall = {}
+        for request in requests:
+            by_hall.setdefault(request.hall, []).append(request)
+        for hall_requests in by_hall.values():
+            hall_requests.sort(key=booking_interval)
+            starts = [request.start for request in hall_requests]
+            ends = sorted(request.end for request in hall_requests)
+            for request in hall_requests:
+                # Requests starting before this one ends, less those that ended by
+                # the time it starts, less itself
+                count = bisect_left(starts, request.end) - bisect_right(ends, request.start) - 1
+                if count:
+                    self.overlap_counts[request.id] = count
+
+            cluster, reach = [], None
+            for request in hall_requests + [None]:
+                if request is None or (cluster and request.start >= reach):
+                    if len(cluster) > 1:
+                        self._add_cluster(cluster)
+                    cluster, reach = [], None
+                if request is not None:
+                    cluster.append(request)
+                    reach = request.end if reach is None else max(reach, request.end)
+
+    def _add_cluster(self, cluster):
+        number = len(self.clusters)
+        self.clusters.append(cluster)
+        prefix_max_ends = []
+        for position, request in enumerate(cluster):
+            self.positions[request.id] = (number, position)
+            prefix_max_ends.append(max(prefix_max_ends[-1], request.end) if prefix_max_ends else request.end)
+        self._prefix_max_ends.append(prefix_max_ends)
+
+    # Up to `limit` of the pending requests overlapping a request, in order of start
+    def overlapping(self, request, limit=None):
+        if request.id not in self.positions:
+            return []
+        number, position = self.positions[request.id]
+        cluster = self.clusters[number]
+        prefix_max_ends = self._prefix_max_ends[number]
+        limit = self.overlap_counts.get(request.id, 0) if limit is None else limit
+
+        # Earlier starts: walk back only while something at or before reaches past the start
+        earlier = []
+        i = position - 1
+        while i >= 0 and prefix_max_ends[i] > request.start and len(earlier) < limit:
+            if cluster[i].end > request.start:
+                earlier.append(cluster[i])
+            i -= 1
+        # Later starts overlap exactly when they start before this request ends
+        later = []
+        i = position + 1
+        while i < len(cluster) and cluster[i].start < request.end and len(earlier) + len(later) < limit:
+            later.append(cluster[i])
+            i += 1
+        return earlier[::-1] + later
+
+    # Requests to deny so that no two remaining requests overlap each other or a
+    # confirmed booking, as (request, reason). In each cluster the requests are
+    # taken in policy order and kept when they fit around the ones already kept.
+    def resolve(self, policy="first-come", directory=None):
+        key = RESOLUTION_POLICIES[policy]
+        losers = [(request, f"{request.hall} is already booked at that time.") for request in self.blocked.values()]
+        for cluster in self.clusters:
+            kept = IntervalIndex()
+            for request in sorted(cluster, key=lambda request: key(request, directory)):
+                if request.id in self.blocked:
+                    continue
+                if kept.overlaps(request.start, request.end):
+                    losers.append((request, "It overlaps a request that was kept."))
+                else:
+                    kept.add(request.start, request.end)
+        return losers
@@ -0,0 +1,81 @@
+# Employee directory read from the master Excel sheet, and login checks
+import hashlib
+import os
+import pickle
+
+from .config import MASTER_CACHE_FILE, MASTER_FILE
+
+# Function to read the master sheet, or None if the file does not exist.
+# pandas is imported here rather than at module level so that the booking
+# engine can be used without loading it.
+def read_master_data(master_file=MASTER_FILE):
+    if not os.path.exists(master_file):
+        return None
+    import pandas as pd
+    return pd.read_excel(master_file)
+
+# Function to turn the master sheet into a directory:
+# Employee_ID (as text) -> (Employee_Name, Password, is_hr).
+# If an Employee_ID appears more than once its first row is used, as logins
+# always matched the first row.
+def build_employee_directory(master_data):
+    ids = master_data['Employee_ID'].astype(str).str.strip().tolist()
+    names = master_data['Employee_Name'].tolist()
+    passwords = master_data['Password'].tolist()
+    if 'Role' in master_data.columns:
+        hr_flags = (master_data['Role'].astype(str).str.strip().str.upper() == 'HR').tolist()
+    else:
+        hr_flags = [False] * len(ids)
+    directory = {}
+    for employee_id, entry in zip(ids, zip(names, passwords, hr_flags)):
+        directory.setdefault(employee_id, entry)
+    return directory
+
+# Version of the pickled directory; bump it when the directory built from a
+# sheet changes, so caches written by older code are rebuilt
+DIRECTORY_CACHE_FORMAT = 2
+
+# Function to read the employee directory for a given master file signature.
+# The directory is pickled next to the master file together with the Excel
+# file's (mtime, size), so a cold start only goes through openpyxl when the
+# sheet has actually changed.
+def read_directory(signature, master_file=MASTER_FILE, cache_file=MASTER_CACHE_FILE):
+    try:
+        with open(cache_file, 'rb') as file:
+            cached = pickle.load(file)
+        if cached['signature'] == signature and cached.get('format') == DIRECTORY_CACHE_FORMAT:
+            return cached['directory']
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        pass
+
+    master_data = read_master_data(master_file)
+    directory = build_employee_directory(master_data) if master_data is not None else {}
+    if signature is not None:
+        try:
+            with open(cache_file, 'wb') as file:
+                pickle.dump({'signature': signature, 'format': DIRECTORY_CACHE_FORMAT, 'directory': directory}, file, pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass
+    return directory
+
+# Function to hash password
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+# Function to verify login
+def verify_login(employee_id, password, directory):
+    employee_id = str(employee_id).strip()
+    user = directory.get(employee_id)
+    if user is None and employee_id.isdigit():
+        # Numeric IDs in the sheet are matched as numbers, e.g. "0042" -> "42"
+        user = directory.get(str(int(employee_id)))
+    
+    if user is not None:
+        user_name, stored_password, is_hr = user
+        
+        # If passwords are stored as hashes in the Excel file
+        # return stored_password == hash_password(password), user_name, is_hr
+        
+        # If passwords are stored in plain text in the Excel file (not recommended for production)
+        return stored_password == password, user_name, is_hr
+    return False, "", False
@@ -0,0 +1,158 @@
+# Availability checks and booking operations built on the index and storage
+import calendar
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .config import HR_PAGE_SIZE, MAX_SERIES_OCCURRENCES, WORKING_HOURS
+from .index import find_batch_conflicts
+from .models import booking_interval, from_minutes, month_span, to_minutes
+
+# Function to check if a time slot is available in a hall
+def is_slot_available(start_datetime, end_datetime, index, hall=None):
+    return not index.overlaps(to_minutes(start_datetime), to_minutes(end_datetime), hall)
+
+# Function to list every hall that is free for a time slot
+def find_free_halls(start_datetime, end_datetime, index):
+    return index.free_halls(to_minutes(start_datetime), to_minutes(end_datetime))
+
+# Function to find every free slot of at least `duration` minutes in a hall on
+# a given date, within working hours given as minutes after midnight.
+# Returns (start_datetime, end_datetime) pairs; nothing before now is offered.
+def find_free_slots(date, duration, index, hall=None, working_hours=WORKING_HOURS):
+    day_start = to_minutes(datetime.combine(date, datetime.min.time()))
+    start = max(day_start + working_hours[0], to_minutes(datetime.now()) + 1)
+    end = day_start + working_hours[1]
+    if end - start < duration:
+        return []
+    return [(from_minutes(gap_start), from_minutes(gap_end)) for gap_start, gap_end in index.free_slots(start, end, duration, hall)]
+
+# Function to expand a recurring booking into (start_datetime, end_datetime)
+# occurrences. frequency is "Daily", "Weekly" or "Monthly"; the series stops at
+# `until` (a date) or after `count` occurrences, whichever comes first. Monthly
+# occurrences skip months that do not have the first occurrence's day.
+def series_occurrences(start_datetime, end_datetime, frequency, until=None, count=None):
+    limit = min(count or MAX_SERIES_OCCURRENCES, MAX_SERIES_OCCURRENCES)
+    duration = end_datetime - start_datetime
+    occurrences = []
+    step = 0
+    while len(occurrences) < limit:
+        if frequency == "Daily":
+            start = start_datetime + timedelta(days=step)
+        elif frequency == "Weekly":
+            start = start_datetime + timedelta(weeks=step)
+        else:
+            months = start_datetime.month - 1 + step
+            year, month = start_datetime.year + months // 12, months % 12 + 1
+            if start_datetime.day > calendar.monthrange(year, month)[1]:
+                step += 1
+                continue
+            start = start_datetime.replace(year=year, month=month)
+        if until is not None and start.date() > until:
+            break
+        occurrences.append((start, start + duration))
+        step += 1
+    return occurrences
+
+# Function to check every occurrence of a series in one pass.
+# Returns one status per occurrence: "Available", "Conflict", "Overlaps series" or "In the past".
+def check_series(occurrences, index, hall):
+    starts = [to_minutes(start) for start, _ in occurrences]
+    ends = [to_minutes(end) for _, end in occurrences]
+    existing, internal = find_batch_conflicts(starts, ends, [hall] * len(occurrences), index)
+    now = to_minutes(datetime.now())
+    statuses = np.where(existing, "Conflict", np.where(internal, "Overlaps series", "Available"))
+    statuses = np.where(np.asarray(starts, dtype=np.int64) < now, "In the past", statuses)
+    return statuses.tolist()
+
+# Function to check whether a booking matches an "Employee ID or name" filter
+def matches_employee(booking, term):
+    return str(booking.user_id).lower() == term or term in booking.booked_by.lower()
+
+# Function to select one page of confirmed bookings starting in [start, end).
+# Positions come straight from the index, so without an employee filter only the
+# bookings on the requested page are touched; an exact Employee ID is looked up
+# in the per-user index, and only a name is matched by scanning the range.
+# Finished bookings moved to the monthly archive are included when
+# `archived_months` and `load_month(year, month) -> bookings` are given; only
+# the months the range reaches into are loaded, and they come before the
+# bookings still in the index. Returns (page_bookings, total).
+def query_bookings_page(index, start=None, end=None, employee="", newest_first=False, page=0, page_size=HR_PAGE_SIZE,
+                        archived_months=(), load_month=None):
+    user_id = employee.strip()
+    term = user_id.lower()
+    by_id = bool(user_id) and user_id in index.by_user
+
+    def matches(booking):
+        if by_id:
+            return str(booking.user_id) == user_id
+        return not term or matches_employee(booking, term)
+
+    archived = []
+    for year, month in archived_months:
+        month_start, month_end = month_span(year, month)
+        if (start is not None and month_end <= start) or (end is not None and month_start >= end):
+            continue
+        archived.extend(
+            booking for booking in load_month(year, month)
+            if (start is None or booking.start >= start) and (end is None or booking.start < end) and matches(booking)
+        )
+    archived.sort(key=booking_interval)
+
+    if by_id:
+        # The user's bookings are sorted by start, so the range is a slice of them
+        source = index.user_bookings(user_id)
+        starts = [booking.start for booking in source]
+        lo = 0 if start is None else bisect_left(starts, start)
+        hi = len(starts) if end is None else bisect_left(starts, end)
+        positions = range(lo, max(lo, hi))
+    else:
+        source = index.by_start
+        lo, hi = index.span(start, end)
+        positions = range(lo, hi)
+        if term:
+            positions = [i for i in positions if matches_employee(source[i], term)]
+
+    # Archived bookings first, then the index, newest last unless newest_first
+    total = len(archived) + len(positions)
+    order = range(total)[::-1] if newest_first else range(total)
+    return [
+        archived[k] if k < len(archived) else source[positions[k - len(archived)]]
+        for k in order[page * page_size:(page + 1) * page_size]
+    ], total
+
+# Function to select one page of pending requests starting in [start, end),
+# filtered and ordered like query_bookings_page. The queue is small and held in
+# memory, so it is simply filtered and sorted. Returns (page_requests, total).
+def query_requests_page(requests, start=None, end=None, employee="", newest_first=False, page=0, page_size=HR_PAGE_SIZE):
+    term = employee.strip().lower()
+    matching = sorted(
+        (request for request in requests
+         if (start is None or request.start >= start) and (end is None or request.start < end)
+         and (not term or matches_employee(request, term))),
+        key=booking_interval, reverse=newest_first)
+    return matching[page * page_size:(page + 1) * page_size], len(matching)
+
+# Function to store new bookings: confirmed straight away when auto_approve is
+# set (HR bookings), otherwise as requests waiting for HR. Raises
+# BookingConflictError if any of them is no longer free.
+def submit_bookings(storage, bookings, auto_approve=False):
+    if auto_approve:
+        for booking in bookings:
+            booking.status = 'approved'
+        storage.add_bookings(bookings)
+    else:
+        storage.add_pending_bookings(bookings)
+    return bookings
+
+# Function to move bookings that finished before `today` out of the hot store
+# into the monthly archive. Runs at most once a day per storage object and
+# returns the number of bookings archived.
+def archive_finished(storage, today=None):
+    today = today or datetime.now().date()
+    if storage.archived_through == today:
+        return 0
+    count = storage.archive_before(to_minutes(datetime.combine(today, datetime.min.time())))
+    storage.archived_through = today
+    return count
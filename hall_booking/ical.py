@@ -0,0 +1,94 @@
+# iCalendar (RFC 5545) export of confirmed bookings. Calendars are produced by
+# generators, one event at a time, so memory stays flat however much history is
+# exported: the hot store is walked through the booking index and archived
+# months are loaded one at a time.
+import hashlib
+from datetime import datetime, timezone
+
+from .models import booking_interval, month_span
+
+PRODUCT_ID = "-//Hall Booking System//EN"
+
+# Function to escape a TEXT value
+def escape_text(value):
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+# Function to fold a content line at 75 octets, as RFC 5545 requires
+def fold_line(line):
+    data = line.encode()
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while data:
+        cut = min(limit, len(data))
+        # Never split a UTF-8 sequence
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode())
+        data = data[cut:]
+        limit = 74
+    return "\r\n ".join(parts) + "\r\n"
+
+# Function to format a datetime as a floating local DATE-TIME, matching the
+# wall-clock times the bookings are made in
+def format_datetime(value):
+    return value.strftime("%Y%m%dT%H%M%S")
+
+# Function to yield the confirmed bookings starting in [start, end) (minutes,
+# None for an open end), optionally only one user's or one hall's: archived
+# months overlapping the range first, each loaded on its own, then the
+# bookings in the index
+def iter_bookings(storage, index, user_id=None, start=None, end=None, hall=None):
+    def wanted(booking):
+        return ((user_id is None or str(booking.user_id) == str(user_id))
+                and (hall is None or booking.hall == hall)
+                and (start is None or booking.start >= start)
+                and (end is None or booking.start < end))
+
+    for year, month in storage.archived_months():
+        month_start, month_end = month_span(year, month)
+        if (start is not None and month_end <= start) or (end is not None and month_start >= end):
+            continue
+        for booking in sorted(storage.load_archived(year, month), key=booking_interval):
+            if wanted(booking):
+                yield booking
+
+    if user_id is not None:
+        # Only the user's own bookings are looked at
+        for booking in index.user_bookings(user_id):
+            if wanted(booking):
+                yield booking
+        return
+    lo, hi = index.span(start, end)
+    for position in range(lo, hi):
+        booking = index.by_start[position]
+        if wanted(booking):
+            yield booking
+
+# Function to yield an iCalendar document for the given bookings, one event at
+# a time; with purposes=False events are titled by hall only
+def iter_calendar(bookings, name, stamp=None, purposes=True):
+    stamp = (stamp or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    yield ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+           f"PRODID:{PRODUCT_ID}\r\nCALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n"
+           + fold_line(f"X-WR-CALNAME:{escape_text(name)}"))
+    for booking in bookings:
+        summary = f"{booking.hall}: {booking.purpose}" if purposes and booking.purpose else f"{booking.hall} booking"
+        yield ("BEGIN:VEVENT\r\n"
+               f"UID:{booking.id}@hall-booking\r\n"
+               f"DTSTAMP:{stamp}\r\n"
+               f"DTSTART:{format_datetime(booking.start_datetime)}\r\n"
+               f"DTEND:{format_datetime(booking.end_datetime)}\r\n"
+               + fold_line(f"SUMMARY:{escape_text(summary)}")
+               + fold_line(f"LOCATION:{escape_text(booking.hall)}")
+               + fold_line(f"DESCRIPTION:{escape_text(f'Booked by {booking.booked_by}')}")
+               + "STATUS:CONFIRMED\r\nEND:VEVENT\r\n")
+    yield "END:VCALENDAR\r\n"
+
+# Function to get the ETag of an export: the same bookings version and filters
+# always produce the same events
+def calendar_etag(version, *filters):
+    digest = hashlib.sha1(repr((version,) + filters).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
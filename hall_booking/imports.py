@@ -0,0 +1,123 @@
+# Bulk import of pre-arranged bookings from an Excel or CSV sheet with the
+# columns Employee_ID, Date, Start_Time, End_Time and optionally Purpose and
+# Hall. Every row is validated column-wise with pandas, conflicts with the
+# confirmed bookings and between rows are found in one sorted sweep
+# (find_batch_conflicts) in which only accepted rows block later ones, and the
+# accepted rows are stored in one write.
+# pandas is imported inside the functions, as in directory.py.
+from datetime import datetime
+
+from .config import DEFAULT_HALL, EPOCH, HALLS
+from .engine import submit_bookings
+from .index import find_batch_conflicts
+from .models import Booking, to_minutes
+
+IMPORT_COLUMNS = ['Employee_ID', 'Date', 'Start_Time', 'End_Time']
+OPTIONAL_IMPORT_COLUMNS = ['Purpose', 'Hall']
+
+# Function to read an import sheet from a path or uploaded file; `name` picks
+# the format when `file` is not a path
+def read_import_sheet(file, name=None):
+    import pandas as pd
+    name = (name or str(file)).lower()
+    if name.endswith('.csv'):
+        sheet = pd.read_csv(file, dtype={'Employee_ID': str})
+    else:
+        sheet = pd.read_excel(file, dtype={'Employee_ID': str})
+    sheet.columns = [str(column).strip() for column in sheet.columns]
+    missing = [column for column in IMPORT_COLUMNS if column not in sheet.columns]
+    if missing:
+        raise ValueError(f"The sheet is missing the column(s): {', '.join(missing)}")
+    return sheet
+
+# Function to parse a column of HH:MM (or HH:MM:SS) times into minutes after midnight
+def parse_time_column(column):
+    import pandas as pd
+    text = column.astype(str).str.strip()
+    parsed = pd.to_datetime(text, format="%H:%M", errors='coerce').combine_first(
+        pd.to_datetime(text, format="%H:%M:%S", errors='coerce'))
+    return parsed.dt.hour * 60 + parsed.dt.minute
+
+# Function to parse a column of dates: ISO dates first, then day-first dates
+# as shown in the app (dd-mm-YYYY)
+def parse_date_column(column):
+    import pandas as pd
+    return pd.to_datetime(column, format='ISO8601', errors='coerce').combine_first(
+        pd.to_datetime(column, format='mixed', dayfirst=True, errors='coerce')).dt.normalize()
+
+# Function to validate an import sheet against the employee directory and the
+# confirmed bookings. Returns (bookings, rejections): confirmed Booking objects
+# for the accepted rows, and a DataFrame of the rejected rows with their sheet
+# row number and the first reason each was rejected for.
+def plan_import(sheet, directory, index, now=None):
+    import numpy as np
+    import pandas as pd
+    now = to_minutes(now or datetime.now())
+    reasons = pd.Series("", index=sheet.index, dtype=object)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    # Employee IDs as in the directory; numeric IDs match as numbers ("0042" -> "42").
+    # Only IDs that fit in an int64 are normalised; anything else stays unknown.
+    ids = sheet['Employee_ID'].astype(object).where(sheet['Employee_ID'].notna(), "").astype(str).str.strip()
+    numeric = ids.str.fullmatch(r'\d{1,18}(\.0+)?')
+    as_number = ids.where(numeric, "").map(lambda value: str(int(value.split('.')[0])) if value else "")
+    ids = ids.where(ids.isin(directory) | ~as_number.isin(directory), as_number)
+    reject(ids == "", "Missing employee ID.")
+    reject(~ids.isin(directory), "Unknown employee ID.")
+
+    days = parse_date_column(sheet['Date'])
+    start_times = parse_time_column(sheet['Start_Time'])
+    end_times = parse_time_column(sheet['End_Time'])
+    reject(days.isna(), "Invalid date.")
+    reject(start_times.isna(), "Invalid start time.")
+    reject(end_times.isna(), "Invalid end time.")
+
+    day_minutes = ((days - pd.Timestamp(EPOCH)) // pd.Timedelta(minutes=1)).fillna(0)
+    starts = (day_minutes + start_times.fillna(0)).astype(np.int64)
+    ends = (day_minutes + end_times.fillna(0)).astype(np.int64)
+    reject(ends <= starts, "End time must be after start time.")
+    reject(starts < now, "Cannot book in the past!")
+
+    if 'Hall' in sheet.columns:
+        halls = sheet['Hall'].astype(object).where(sheet['Hall'].notna(), DEFAULT_HALL).astype(str).str.strip()
+    else:
+        halls = pd.Series(DEFAULT_HALL, index=sheet.index, dtype=object)
+    reject(~halls.isin(HALLS), "Unknown hall.")
+
+    # Conflicts, for the rows that passed every other check
+    valid = (reasons == "").to_numpy()
+    existing, internal = find_batch_conflicts(starts[valid], ends[valid], halls[valid], index)
+    conflicts = pd.Series("", index=sheet.index[valid], dtype=object)
+    conflicts[internal] = "Overlaps an accepted row of the sheet."
+    conflicts[existing] = "The hall is already booked at that time."
+    reasons[valid] = conflicts
+
+    accepted = (reasons == "").to_numpy()
+    if 'Purpose' in sheet.columns:
+        purpose_column = sheet['Purpose'][accepted]
+        purposes = purpose_column.astype(object).where(purpose_column.notna(), None).tolist()
+    else:
+        purposes = [None] * int(accepted.sum())
+    bookings = [
+        Booking(user_id, directory[user_id][0], start, end, purpose, 'approved', hall=hall)
+        for user_id, start, end, purpose, hall in zip(ids[accepted].tolist(), starts[accepted].tolist(), ends[accepted].tolist(),
+                                                      purposes, halls[accepted].tolist())
+    ]
+    rejections = sheet[~accepted].copy()
+    # Sheet row numbers as shown in Excel: the header is row 1
+    rejections.insert(0, 'Row', rejections.index + 2)
+    rejections['Reason'] = reasons[~accepted]
+    return bookings, rejections
+
+# Function to store the accepted bookings of an import in one write.
+# Raises BookingConflictError if a slot was taken since the sheet was checked.
+def import_bookings(storage, bookings):
+    if bookings:
+        submit_bookings(storage, bookings, auto_approve=True)
+    return len(bookings)
+
+# Function to write the rejection report as CSV bytes
+def rejection_report(rejections):
+    return rejections.to_csv(index=False).encode()
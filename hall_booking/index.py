@@ -0,0 +1,233 @@
+# In-memory indexes over confirmed bookings and the vectorized batch check
+import calendar
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import numpy as np
+
+from .config import DEFAULT_HALL, HALLS, MINUTES_PER_DAY
+from .models import booking_day, booking_interval, to_minutes
+
+# Sorted interval index over one hall's confirmed bookings.
+# Intervals are kept sorted by start; max_ends[i] is the latest end among the
+# first i + 1 intervals, so an overlap query is a single bisect plus one lookup.
+class IntervalIndex:
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+        self.max_ends = [None] * len(intervals)
+        self._refresh_max_ends(0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    # Recompute the running maximum from position i, stopping once it settles
+    def _refresh_max_ends(self, i):
+        for j in range(i, len(self.starts)):
+            value = self.ends[j] if j == 0 else max(self.max_ends[j - 1], self.ends[j])
+            if self.max_ends[j] == value and j > i:
+                break
+            self.max_ends[j] = value
+
+    def overlaps(self, start, end):
+        # Only intervals starting before `end` can overlap; of those, the one
+        # ending last decides whether any of them reaches past `start`.
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] > start
+
+    def add(self, start, end):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.max_ends.insert(i, None)
+        self._refresh_max_ends(i)
+
+    # Gaps of at least min_length inside [start, end), as (gap_start, gap_end).
+    # One sweep from the first interval that can reach into the window; the
+    # running max of earlier ends covers bookings that started before it.
+    def free_gaps(self, start, end, min_length=1):
+        gaps = []
+        i = bisect_right(self.starts, start)
+        cursor = max(start, self.max_ends[i - 1]) if i > 0 else start
+        while i < len(self.starts) and self.starts[i] < end:
+            if self.starts[i] - cursor >= min_length:
+                gaps.append((cursor, self.starts[i]))
+            cursor = max(cursor, self.ends[i])
+            i += 1
+        if end - cursor >= min_length:
+            gaps.append((cursor, end))
+        return gaps
+
+    def remove(self, start, end):
+        i = bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ends[i] == end:
+                del self.starts[i]
+                del self.ends[i]
+                del self.max_ends[i]
+                self._refresh_max_ends(i)
+                return True
+            i += 1
+        return False
+
+    def copy(self):
+        index = IntervalIndex()
+        index.starts = list(self.starts)
+        index.ends = list(self.ends)
+        index.max_ends = list(self.max_ends)
+        return index
+
+# In-memory indexes over confirmed bookings, built once per bookings version.
+# halls maps each hall to its own IntervalIndex for availability checks;
+# by_start holds every booking sorted by start, for range queries, and days
+# buckets them by the day they start on. by_id finds a booking by its id and
+# by_user lists each user's bookings (keyed by user_id as text) sorted by start.
+class BookingIndex:
+    def __init__(self, bookings=()):
+        bookings = sorted(bookings, key=booking_interval)
+        self.by_start = bookings
+        self.starts = [booking.start for booking in bookings]
+        self.by_id = {booking.id: booking for booking in bookings}
+        self.by_user = {}
+        intervals = {}
+        self.days = {}
+        for booking in bookings:
+            intervals.setdefault(booking.hall, []).append(booking_interval(booking))
+            self.days.setdefault(booking_day(booking), []).append(booking)
+            self.by_user.setdefault(str(booking.user_id), []).append(booking)
+        self.halls = {hall: IntervalIndex(hall_intervals) for hall, hall_intervals in intervals.items()}
+        self.version = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end, hall=None):
+        hall_index = self.halls.get(hall or DEFAULT_HALL)
+        return hall_index is not None and hall_index.overlaps(start, end)
+
+    # Halls (from `halls`, in order) with nothing booked overlapping [start, end)
+    def free_halls(self, start, end, halls=None):
+        return [
+            hall for hall in (halls or HALLS)
+            if hall not in self.halls or not self.halls[hall].overlaps(start, end)
+        ]
+
+    # Free gaps of at least min_length minutes in [start, end) for one hall
+    def free_slots(self, start, end, min_length=1, hall=None):
+        hall_index = self.halls.get(hall or DEFAULT_HALL)
+        if hall_index is None:
+            return [(start, end)] if end - start >= min_length else []
+        return hall_index.free_gaps(start, end, min_length)
+
+    # Positions (lo, hi) in by_start of the bookings starting in [start, end)
+    def span(self, start=None, end=None):
+        lo = 0 if start is None else bisect_left(self.starts, start)
+        hi = len(self.starts) if end is None else bisect_left(self.starts, end)
+        return lo, max(lo, hi)
+
+    # A user's bookings sorted by start, without scanning anyone else's
+    def user_bookings(self, user_id):
+        return self.by_user.get(str(user_id), [])
+
+    # Bookings starting on each day of a month, keyed by day of the month,
+    # optionally only those for one hall
+    def month_bookings(self, year, month, hall=None):
+        first_day = to_minutes(datetime(year, month, 1)) // MINUTES_PER_DAY
+        days_in_month = calendar.monthrange(year, month)[1]
+        month_days = {}
+        for offset in range(days_in_month):
+            day_bookings = self.days.get(first_day + offset)
+            if day_bookings and hall:
+                day_bookings = [b for b in day_bookings if b.hall == hall]
+            if day_bookings:
+                month_days[offset + 1] = day_bookings
+        return month_days
+
+    def add(self, booking):
+        i = bisect_right(self.starts, booking.start)
+        self.by_start.insert(i, booking)
+        self.starts.insert(i, booking.start)
+        self.halls.setdefault(booking.hall, IntervalIndex()).add(*booking_interval(booking))
+        self.by_id[booking.id] = booking
+
+        # Buckets are replaced rather than changed in place, so copies share them
+        day = booking_day(booking)
+        self.days[day] = sorted(self.days.get(day, []) + [booking], key=booking_interval)
+
+        user_bookings = list(self.by_user.get(str(booking.user_id), []))
+        user_bookings.insert(bisect_right([b.start for b in user_bookings], booking.start), booking)
+        self.by_user[str(booking.user_id)] = user_bookings
+
+    def remove(self, booking):
+        indexed = self.by_id.pop(booking.id, None)
+        if indexed is None:
+            return False
+        i = bisect_left(self.starts, indexed.start)
+        while self.by_start[i].id != indexed.id:
+            i += 1
+        del self.by_start[i]
+        del self.starts[i]
+        self.halls[indexed.hall].remove(*booking_interval(indexed))
+
+        for buckets, key in ((self.days, booking_day(indexed)), (self.by_user, str(indexed.user_id))):
+            bucket = [b for b in buckets[key] if b.id != indexed.id]
+            if bucket:
+                buckets[key] = bucket
+            else:
+                del buckets[key]
+        return True
+
+    # A copy that add and remove can change without affecting this index. The
+    # day and user buckets are never changed in place, so they are shared.
+    def copy(self):
+        index = BookingIndex()
+        index.by_start = list(self.by_start)
+        index.starts = list(self.starts)
+        index.by_id = dict(self.by_id)
+        index.by_user = dict(self.by_user)
+        index.days = dict(self.days)
+        index.halls = {hall: hall_index.copy() for hall, hall_index in self.halls.items()}
+        index.version = self.version
+        return index
+
+# Function to check a batch of candidate bookings (parallel sequences of start
+# minutes, end minutes and halls) against the confirmed bookings and against
+# each other, vectorized per hall. Returns two boolean arrays: the candidate
+# overlaps a confirmed booking, and the candidate overlaps an earlier-starting
+# candidate in the batch that is kept, i.e. clear of confirmed bookings and of
+# the kept candidates before it. In a chain 09:00-10:00, 09:30-12:00,
+# 11:00-12:00 only the middle one is rejected: the third overlaps nothing kept.
+def find_batch_conflicts(starts, ends, halls, index):
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    halls = np.asarray(halls, dtype=object)
+    existing = np.zeros(len(starts), dtype=bool)
+    internal = np.zeros(len(starts), dtype=bool)
+    for hall in set(halls.tolist()):
+        positions = np.flatnonzero(halls == hall)
+        hall_starts = starts[positions]
+        hall_ends = ends[positions]
+
+        # Against confirmed bookings: the same bisect + running-max lookup as
+        # IntervalIndex.overlaps, for every candidate at once
+        hall_index = index.halls.get(hall)
+        if hall_index is not None and len(hall_index):
+            booked_starts = np.asarray(hall_index.starts, dtype=np.int64)
+            booked_max_ends = np.asarray(hall_index.max_ends, dtype=np.int64)
+            i = np.searchsorted(booked_starts, hall_ends, side='left')
+            reach = np.where(i > 0, booked_max_ends[np.maximum(i - 1, 0)], np.iinfo(np.int64).min)
+            existing[positions] = reach > hall_starts
+
+        # Within the batch: sort the remaining candidates by start and compare
+        # each start with the latest end among the candidates kept before it
+        clear = positions[~existing[positions]]
+        if len(clear) > 1:
+            order = clear[np.lexsort((ends[clear], starts[clear]))]
+            latest_end = None
+            for position, start, end in zip(order.tolist(), starts[order].tolist(), ends[order].tolist()):
+                if latest_end is not None and start < latest_end:
+                    internal[position] = True
+                else:
+                    latest_end = end
+    return existing, internal
@@ -0,0 +1,119 @@
+# Process-wide timing spans, counters and gauges for the hot paths, with a
+# Prometheus text exposition that a local scraper can read from a file.
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "hall_booking"
+
+# Timing spans (name -> calls, total and slowest seconds), counters and gauges.
+# Spans opened on a thread that has started a trace are also recorded in that
+# trace, so one Streamlit rerun (one script thread) can be broken down.
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+        self.last_written = 0.0
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            calls, total, slowest = self.spans.get(name, (0, 0.0, 0.0))
+            self.spans[name] = (calls + 1, total + seconds, max(slowest, seconds))
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.append((name, seconds))
+
+    def increment(self, name, value=1, help=None):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if help:
+                self.help[name] = help
+
+    def set_gauge(self, name, value, help=None):
+        with self._lock:
+            self.gauges[name] = value
+            if help:
+                self.help[name] = help
+
+    # Start recording the spans of the current thread, e.g. one rerun
+    def start_trace(self):
+        self._local.trace = []
+
+    # Stop recording and return the (name, seconds) spans in the order they ended
+    def end_trace(self):
+        trace = getattr(self._local, 'trace', None) or []
+        self._local.trace = None
+        return trace
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.spans), dict(self.counters), dict(self.gauges)
+
+    def to_prometheus(self):
+        spans, counters, gauges = self.snapshot()
+        lines = []
+        if spans:
+            name = f"{METRIC_PREFIX}_span_seconds"
+            lines.append(f"# HELP {name} Time spent in instrumented code paths.")
+            lines.append(f"# TYPE {name} summary")
+            for span, (calls, total, _) in sorted(spans.items()):
+                lines.append(f'{name}_count{{span="{span}"}} {calls}')
+                lines.append(f'{name}_sum{{span="{span}"}} {total:.6f}')
+            lines.append(f"# HELP {name}_max Slowest call of each instrumented code path.")
+            lines.append(f"# TYPE {name}_max gauge")
+            for span, (_, _, slowest) in sorted(spans.items()):
+                lines.append(f'{name}_max{{span="{span}"}} {slowest:.6f}')
+        for kind, values, suffix in (("counter", counters, "_total"), ("gauge", gauges, "")):
+            for metric, value in sorted(values.items()):
+                name = f"{METRIC_PREFIX}_{metric}{suffix}"
+                if metric in self.help:
+                    lines.append(f"# HELP {name} {self.help[metric]}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Write the Prometheus text file, at most once every `interval` seconds.
+    # Written to a temporary file and swapped in, so a scraper never reads half a file.
+    def write_prometheus(self, path, interval=0):
+        now = time.monotonic()
+        if interval and now - self.last_written < interval:
+            return False
+        self.last_written = now
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write(self.to_prometheus())
+        os.replace(temp_path, path)
+        return True
+
+# The registry shared by the whole process
+METRICS = Metrics()
+
+# Decorator to time every call of a function as the span `name`
+def timed(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Function to time the given methods of a class, as spans named "<prefix>.<method>"
+def instrument(cls, methods, prefix):
+    for method in methods:
+        setattr(cls, method, timed(f"{prefix}.{method}")(getattr(cls, method)))
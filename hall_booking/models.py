@@ -0,0 +1,106 @@
+# Booking records and the minute-based time helpers they are stored with
+import uuid
+from datetime import datetime, timedelta
+
+from .config import DATETIME_FORMAT, DEFAULT_HALL, EPOCH, MINUTES_PER_DAY
+
+# Function to convert a datetime to whole minutes since EPOCH
+def to_minutes(dt):
+    return (dt - EPOCH) // timedelta(minutes=1)
+
+# Function to convert minutes since EPOCH back to a datetime
+def from_minutes(minutes):
+    return EPOCH + timedelta(minutes=minutes)
+
+# Function to get the (start, end) minutes of a calendar month
+def month_span(year, month):
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return to_minutes(datetime(year, month, 1)), to_minutes(datetime(next_year, next_month, 1))
+
+# Function to parse an optional DATETIME_FORMAT timestamp into minutes
+def parse_optional_minutes(value):
+    return to_minutes(datetime.strptime(value, DATETIME_FORMAT)) if value else None
+
+# A booking or booking request. Times are parsed once when the record is loaded
+# and kept as integer minutes since EPOCH; to_dict() writes the same JSON shape
+# the booking files have always used, plus a stable id. An approved request
+# keeps its id when it is copied into the confirmed bookings. requested_at and
+# decided_at (minutes, or None for records from earlier versions) are when a
+# request was submitted and decided.
+class Booking:
+    __slots__ = ('id', 'user_id', 'booked_by', 'start', 'end', 'purpose', 'status', 'status_updated', 'hall', 'series_id',
+                 'requested_at', 'decided_at')
+
+    def __init__(self, user_id, booked_by, start, end, purpose=None, status='pending', status_updated=False, booking_id=None, hall=None,
+                 series_id=None, requested_at=None, decided_at=None):
+        self.id = booking_id or uuid.uuid4().hex
+        self.hall = hall or DEFAULT_HALL
+        self.series_id = series_id
+        self.requested_at = requested_at
+        self.decided_at = decided_at
+        self.user_id = user_id
+        self.booked_by = booked_by
+        self.start = start
+        self.end = end
+        self.purpose = purpose
+        self.status = status
+        self.status_updated = status_updated
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['user_id'],
+            data['booked_by'],
+            to_minutes(datetime.strptime(data['start_datetime'], DATETIME_FORMAT)),
+            to_minutes(datetime.strptime(data['end_datetime'], DATETIME_FORMAT)),
+            data.get('purpose'),
+            data.get('status', 'pending'),
+            data.get('status_updated', False),
+            data.get('id'),
+            data.get('hall'),
+            data.get('series_id'),
+            parse_optional_minutes(data.get('requested_at')),
+            parse_optional_minutes(data.get('decided_at')),
+        )
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'hall': self.hall,
+            'user_id': self.user_id,
+            'booked_by': self.booked_by,
+            'start_datetime': self.start_datetime.strftime(DATETIME_FORMAT),
+            'end_datetime': self.end_datetime.strftime(DATETIME_FORMAT),
+            'status': self.status,
+        }
+        if self.purpose is not None:
+            data['purpose'] = self.purpose
+        if self.status_updated:
+            data['status_updated'] = True
+        if self.series_id:
+            data['series_id'] = self.series_id
+        if self.requested_at is not None:
+            data['requested_at'] = from_minutes(self.requested_at).strftime(DATETIME_FORMAT)
+        if self.decided_at is not None:
+            data['decided_at'] = from_minutes(self.decided_at).strftime(DATETIME_FORMAT)
+        return data
+
+    def copy(self):
+        return Booking(self.user_id, self.booked_by, self.start, self.end, self.purpose, self.status, self.status_updated, self.id, self.hall,
+                       self.series_id, self.requested_at, self.decided_at)
+
+    @property
+    def start_datetime(self):
+        return from_minutes(self.start)
+
+    @property
+    def end_datetime(self):
+        return from_minutes(self.end)
+
+# Function to get a booking's (start, end) interval in minutes
+def booking_interval(booking):
+    return booking.start, booking.end
+
+# Function to get the day number (days since EPOCH) a booking starts on
+def booking_day(booking):
+    return booking.start // MINUTES_PER_DAY
@@ -0,0 +1,988 @@
+# Storage backends for bookings, pending requests and notifications. They share
+# one duck-typed interface, so the app and the CLI never depend on the backend.
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from .config import (ARCHIVE_DIR, BOOKINGS_FILE, DECISIONS_FILE, JOURNAL_COMPACT_BYTES, JOURNAL_PREFIX, JOURNAL_SNAPSHOT_FILE,
+                     NOTIFICATIONS_FILE, PENDING_FILE, SQLITE_FILE, STORAGE_BACKEND, STORAGE_LOCK_TIMEOUT)
+from .index import BookingIndex, find_batch_conflicts
+from .metrics import METRICS, instrument
+from .models import Booking, booking_interval, from_minutes, month_span, to_minutes
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+# Function to read a booking file into Booking records.
+# Records written before bookings had ids get one derived from their fields (and
+# from how many identical records come before them), so every reader gives a
+# record the same id without writing the file; the next locked write stores it.
+def read_booking_file(path):
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            try:
+                records = json.load(file)
+            except json.JSONDecodeError:
+                return []
+        bookings = []
+        seen = {}
+        for data in records:
+            if 'id' not in data:
+                key = json.dumps(data, sort_keys=True)
+                seen[key] = seen.get(key, 0) + 1
+                data = dict(data, id=hashlib.sha1(f"{key}#{seen[key]}".encode()).hexdigest()[:32])
+            bookings.append(Booking.from_dict(data))
+        return bookings
+    else:
+        return []
+
+# Function to write Booking records to a booking file.
+# Written to a temporary file and swapped in, so readers never see a partial file.
+def write_booking_file(path, bookings):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as file:
+        json.dump([booking.to_dict() for booking in bookings], file)
+        METRICS.increment('write_bytes', file.tell(), "Bytes written to booking files.")
+    for attempt in range(50):
+        try:
+            os.replace(temp_path, path)
+            return
+        except PermissionError:
+            # Windows refuses to replace a file another reader has open
+            time.sleep(0.01)
+    os.replace(temp_path, path)
+
+# Raised when a write loses a race with another session, e.g. the slot was
+# booked or the request decided in the meantime. The message is shown to the user.
+class BookingConflictError(Exception):
+    pass
+
+# Function to hold an exclusive lock on a lock file around one read-check-write.
+# Locks are per write, never across a rerun, so sessions only wait for each
+# other's file rewrite.
+@contextmanager
+def file_lock(path, timeout=STORAGE_LOCK_TIMEOUT):
+    with open(path, 'a+b') as file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if os.name == 'nt':
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise BookingConflictError("The booking system is busy.")
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+# Function to make sure new bookings overlap neither the given confirmed
+# bookings nor each other; raises BookingConflictError naming the first clash
+def ensure_slots_free(candidates, bookings):
+    existing, internal = find_batch_conflicts(
+        [c.start for c in candidates], [c.end for c in candidates], [c.hall for c in candidates], BookingIndex(bookings))
+    for candidate, taken, clashes in zip(candidates, existing, internal):
+        if taken or clashes:
+            raise BookingConflictError(
+                f"{candidate.hall} is no longer free on {candidate.start_datetime.strftime('%d-%m-%Y %H:%M')}."
+            )
+
+# Function to work out which of a batch of HR decisions can be applied, given
+# the current pending requests and confirmed bookings. Approvals are checked
+# against the confirmed bookings and against each other in one pass.
+# Returns (approved, denied, skipped); skipped pairs a request with the reason.
+def plan_decisions(approvals, denials, pending_bookings, bookings):
+    pending_by_id = {pending.id: pending for pending in pending_bookings}
+    skipped = []
+
+    def undecided(requests):
+        current = []
+        for request in requests:
+            pending = pending_by_id.get(request.id)
+            if pending is None:
+                skipped.append((request, "This request no longer exists."))
+            elif pending.status_updated:
+                skipped.append((request, f"This request was already {pending.status}."))
+            else:
+                current.append(pending)
+        return current
+
+    approvals = undecided(approvals)
+    denied = undecided(denials)
+    approved = []
+    if approvals:
+        existing, internal = find_batch_conflicts(
+            [r.start for r in approvals], [r.end for r in approvals], [r.hall for r in approvals], BookingIndex(bookings))
+        for request, taken, clashes in zip(approvals, existing, internal):
+            if taken:
+                skipped.append((request, f"{request.hall} is no longer free on {request.start_datetime.strftime('%d-%m-%Y %H:%M')}."))
+            elif clashes:
+                skipped.append((request, "It overlaps another request approved in the same batch."))
+            else:
+                approved.append(request)
+    return approved, denied, skipped
+
+# Function to group decided requests into a per-user inbox: user_id -> [Booking]
+def group_by_user(bookings):
+    inbox = {}
+    for booking in bookings:
+        inbox.setdefault(str(booking.user_id), []).append(booking)
+    return inbox
+
+# Function to stamp new requests with the time they were submitted
+def stamp_requested(requests):
+    now = to_minutes(datetime.now())
+    for request in requests:
+        if request.requested_at is None:
+            request.requested_at = now
+
+# Function to copy a request as decided with `status` at `decided_at` (minutes)
+def decided_request(request, status, decided_at):
+    decided = request.copy()
+    decided.status = status
+    decided.status_updated = True
+    decided.decided_at = decided_at
+    return decided
+
+# Function to copy an approved request into a confirmed booking record
+def approved_booking(request):
+    booking = request.copy()
+    booking.status = 'approved'
+    booking.status_updated = True
+    return booking
+
+# Operations shared by every storage backend, written in terms of the batch
+# operations each backend implements (add_bookings, add_pending_bookings, decide)
+class BookingStorage:
+    def add_booking(self, booking):
+        self.add_bookings([booking])
+
+    def add_pending(self, request):
+        self.add_pending_bookings([request])
+
+    # Returns the request as approved
+    def approve(self, request):
+        approved, _, skipped = self.decide([request], [])
+        if skipped:
+            raise BookingConflictError(skipped[0][1])
+        return approved[0]
+
+    def deny(self, request):
+        _, _, skipped = self.decide([], [request])
+        if skipped:
+            raise BookingConflictError(skipped[0][1])
+
+    # (bookings version before, bookings version after) of the calling thread's
+    # last write that changed the confirmed bookings, or None. A cache can tell
+    # from it whether its own write was the only change since it last looked.
+    def last_bookings_write(self):
+        return getattr(self._writes, 'bookings', None)
+
+# Function to get the (mtime, size) signature of a file
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Completed bookings partitioned into one JSON file per month (by start time).
+# Used by the file-based storage backends; partitions are only read when a past
+# month is actually asked for.
+class MonthlyArchive:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, year, month):
+        return os.path.join(self.directory, f"bookings-{year:04d}-{month:02d}.json")
+
+    def add(self, bookings):
+        partitions = {}
+        for booking in bookings:
+            start = booking.start_datetime
+            partitions.setdefault((start.year, start.month), []).append(booking)
+        os.makedirs(self.directory, exist_ok=True)
+        for (year, month), month_bookings in partitions.items():
+            path = self.path(year, month)
+            # Keyed by id so re-running an interrupted archival does not duplicate
+            merged = {b.id: b for b in read_booking_file(path)}
+            merged.update((b.id, b) for b in month_bookings)
+            write_booking_file(path, sorted(merged.values(), key=booking_interval))
+
+    def load(self, year, month):
+        return read_booking_file(self.path(year, month))
+
+    def version(self, year, month):
+        return file_signature(self.path(year, month))
+
+    def months(self):
+        paths = glob.glob(os.path.join(glob.escape(self.directory), "bookings-*-*.json"))
+        names = (os.path.basename(path)[len("bookings-"):-len(".json")] for path in paths)
+        return sorted(tuple(int(part) for part in name.split('-')) for name in names)
+
+# Every decided request as an append-only JSON-lines file, kept for analytics
+# after the requester has acknowledged the decision. Used by the file-based
+# storage backends; readers pass back the offset they reached, so each read
+# returns only the decisions appended since.
+class DecisionLog:
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, requests):
+        if not requests:
+            return
+        data = "".join(json.dumps(request.to_dict()) + "\n" for request in requests).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            METRICS.increment('write_bytes', len(data), "Bytes written to booking files.")
+        finally:
+            os.close(fd)
+
+    # Decisions after byte `offset`, and the offset to continue from
+    def read(self, offset=0):
+        if not os.path.exists(self.path):
+            return [], offset
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            data = file.read()
+        # Only whole lines; a concurrent append may be half written
+        complete = data[:data.rfind(b"\n") + 1]
+        return [Booking.from_dict(json.loads(line)) for line in complete.splitlines()], offset + len(complete)
+
+# Storage backed by the original bookings.json / pending_bookings.json files.
+# Every write rewrites the affected file. Writes that depend on current state
+# re-read and check it under a short file lock, so two sessions cannot both
+# take the same slot or decide the same request. Decided requests move out of
+# the pending file into a notifications file until their requester sees them.
+class JsonStorage(BookingStorage):
+    def __init__(self, bookings_file, pending_file, archive_dir=ARCHIVE_DIR, notifications_file=NOTIFICATIONS_FILE,
+                 decisions_file=DECISIONS_FILE):
+        self.bookings_file = bookings_file
+        self.pending_file = pending_file
+        self.notifications_file = notifications_file
+        self.lock_file = bookings_file + ".lock"
+        self.archive = MonthlyArchive(archive_dir)
+        self.decisions = DecisionLog(decisions_file)
+        self.archived_through = None
+        self._writes = threading.local()
+        # (file signature, user_id -> [Booking]) for the notifications file
+        self._inbox = (None, {})
+        self._move_decided()
+
+    # Earlier versions kept decisions in the pending file until they were
+    # acknowledged; move any such records into the notifications file
+    def _move_decided(self):
+        if not any(b.status_updated for b in self.load_pending_bookings()):
+            return
+        with file_lock(self.lock_file):
+            pending_bookings = self.load_pending_bookings()
+            decided = [b for b in pending_bookings if b.status_updated]
+            if decided:
+                write_booking_file(self.notifications_file, read_booking_file(self.notifications_file) + decided)
+                self.save_pending_bookings([b for b in pending_bookings if not b.status_updated])
+
+    def load_bookings(self):
+        return read_booking_file(self.bookings_file)
+
+    def load_pending_bookings(self):
+        return read_booking_file(self.pending_file)
+
+    def save_bookings(self, bookings):
+        before = file_signature(self.bookings_file)
+        write_booking_file(self.bookings_file, bookings)
+        self._writes.bookings = (before, file_signature(self.bookings_file))
+
+    def save_pending_bookings(self, pending_bookings):
+        write_booking_file(self.pending_file, pending_bookings)
+
+    def bookings_version(self):
+        return file_signature(self.bookings_file)
+
+    def pending_version(self):
+        return file_signature(self.pending_file)
+
+    def add_bookings(self, new_bookings):
+        with file_lock(self.lock_file):
+            bookings = self.load_bookings()
+            ensure_slots_free(new_bookings, bookings)
+            bookings.extend(new_bookings)
+            self.save_bookings(bookings)
+
+    def cancel_booking(self, booking):
+        with file_lock(self.lock_file):
+            bookings = self.load_bookings()
+            remaining = [b for b in bookings if b.id != booking.id]
+            if len(remaining) == len(bookings):
+                raise BookingConflictError("This booking was already cancelled.")
+            self.save_bookings(remaining)
+
+    def add_pending_bookings(self, requests):
+        stamp_requested(requests)
+        with file_lock(self.lock_file):
+            ensure_slots_free(requests, self.load_bookings())
+            pending_bookings = self.load_pending_bookings()
+            pending_bookings.extend(requests)
+            self.save_pending_bookings(pending_bookings)
+
+    # Apply a batch of approvals and denials with one rewrite of each file
+    def decide(self, approvals, denials):
+        with file_lock(self.lock_file):
+            pending_bookings = self.load_pending_bookings()
+            notifications = read_booking_file(self.notifications_file)
+            bookings = self.load_bookings()
+            approved, denied, skipped = plan_decisions(approvals, denials, pending_bookings + notifications, bookings)
+            now = to_minutes(datetime.now())
+            approved = [decided_request(request, 'approved', now) for request in approved]
+            denied = [decided_request(request, 'denied', now) for request in denied]
+            if approved:
+                bookings.extend(approved_booking(request) for request in approved)
+                self.save_bookings(bookings)
+            if approved or denied:
+                decided_ids = {request.id for request in approved + denied}
+                write_booking_file(self.notifications_file, notifications + approved + denied)
+                self.save_pending_bookings([b for b in pending_bookings if b.id not in decided_ids])
+                self.decisions.append(approved + denied)
+        return approved, denied, skipped
+
+    # Decided requests after `cursor`, and the cursor to continue from
+    def load_decisions(self, cursor=0):
+        return self.decisions.read(cursor)
+
+    # Decisions the user has not seen yet. The per-user inbox is rebuilt only
+    # when the notifications file changes, so checking costs one stat per rerun.
+    def load_notifications(self, user_id):
+        signature = file_signature(self.notifications_file)
+        if self._inbox[0] != signature:
+            self._inbox = (signature, group_by_user(read_booking_file(self.notifications_file)))
+        return list(self._inbox[1].get(str(user_id), ()))
+
+    def acknowledge(self, requests):
+        ids = {request.id for request in requests}
+        if not ids:
+            return
+        with file_lock(self.lock_file):
+            notifications = read_booking_file(self.notifications_file)
+            remaining = [b for b in notifications if b.id not in ids]
+            if len(remaining) != len(notifications):
+                write_booking_file(self.notifications_file, remaining)
+
+    # Move bookings that ended by `cutoff` (minutes) into the monthly archive
+    def archive_before(self, cutoff):
+        with file_lock(self.lock_file):
+            bookings = self.load_bookings()
+            finished = [b for b in bookings if b.end <= cutoff]
+            if finished:
+                self.archive.add(finished)
+                self.save_bookings([b for b in bookings if b.end > cutoff])
+        return len(finished)
+
+    def load_archived(self, year, month):
+        return self.archive.load(year, month)
+
+    def archive_version(self, year, month):
+        return self.archive.version(year, month)
+
+    def archived_months(self):
+        return self.archive.months()
+
+# Storage backed by a SQLite database in WAL mode. Bookings and pending requests
+# live in two tables indexed by start time, user and status; each write touches
+# only the affected rows. Writes that depend on current state (a free slot, an
+# undecided request) check it inside a BEGIN IMMEDIATE transaction.
+class SqliteStorage(BookingStorage):
+    COLUMNS = ("id, user_id, booked_by, start_minute, end_minute, purpose, status, status_updated, hall, series_id, "
+               "requested_at, decided_at")
+    PLACEHOLDERS = ", ".join("?" * len(COLUMNS.split(", ")))
+
+    def __init__(self, path, bookings_file=None, pending_file=None):
+        self.path = path
+        self.archived_through = None
+        self._writes = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for table in ("bookings", "pending_bookings", "notifications", "archived_bookings", "decisions"):
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id TEXT PRIMARY KEY,
+                        user_id TEXT NOT NULL,
+                        booked_by TEXT NOT NULL,
+                        start_minute INTEGER NOT NULL,
+                        end_minute INTEGER NOT NULL,
+                        purpose TEXT,
+                        status TEXT NOT NULL,
+                        status_updated INTEGER NOT NULL DEFAULT 0,
+                        hall TEXT,
+                        series_id TEXT,
+                        requested_at INTEGER,
+                        decided_at INTEGER
+                    )
+                """)
+                # Databases created by earlier versions lack the newer columns
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for column, column_type in (('hall', 'TEXT'), ('series_id', 'TEXT'), ('requested_at', 'INTEGER'), ('decided_at', 'INTEGER')):
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_start ON {table} (start_minute)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_hall_start ON {table} (hall, start_minute)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_user ON {table} (user_id)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_status ON {table} (status)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('bookings_version', 0)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('archive_version', 0)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('pending_version', 0)")
+        if bookings_file or pending_file:
+            self.migrate_from_json(bookings_file, pending_file)
+        with self._connect() as conn:
+            # Earlier versions kept decisions in pending_bookings until acknowledged
+            conn.execute(f"INSERT OR REPLACE INTO notifications ({self.COLUMNS}) "
+                         f"SELECT {self.COLUMNS} FROM pending_bookings WHERE status_updated = 1")
+            if conn.execute("DELETE FROM pending_bookings WHERE status_updated = 1").rowcount:
+                self._bump_version(conn, 'pending_version')
+
+    # Connection scoped to one transaction: committed on success, rolled back on
+    # error. immediate takes the write lock up front so a check and the write
+    # that depends on it cannot interleave with another writer.
+    @contextmanager
+    def _connect(self, immediate=False):
+        conn = sqlite3.connect(self.path, timeout=STORAGE_LOCK_TIMEOUT)
+        try:
+            with conn:
+                if immediate:
+                    conn.execute("BEGIN IMMEDIATE")
+                yield conn
+        except sqlite3.OperationalError as error:
+            if 'locked' in str(error):
+                raise BookingConflictError("The booking system is busy.") from error
+            raise
+        finally:
+            conn.close()
+
+    # Confirmed bookings that could overlap any of the candidates
+    def _bookings_near(self, conn, candidates):
+        rows = conn.execute(f"SELECT {self.COLUMNS} FROM bookings WHERE start_minute < ? AND end_minute > ?",
+                            (max(c.end for c in candidates), min(c.start for c in candidates))).fetchall()
+        return [self._booking(row) for row in rows]
+
+    # Pending and already decided requests with the given ids
+    def _requests_with_ids(self, conn, ids):
+        bookings = []
+        for table in ("pending_bookings", "notifications"):
+            for chunk_start in range(0, len(ids), 500):
+                chunk = ids[chunk_start:chunk_start + 500]
+                rows = conn.execute(f"SELECT {self.COLUMNS} FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})",
+                                    chunk).fetchall()
+                bookings.extend(self._booking(row) for row in rows)
+        return bookings
+
+    @staticmethod
+    def _row(booking):
+        return (booking.id, str(booking.user_id), booking.booked_by, booking.start, booking.end,
+                booking.purpose, booking.status, int(booking.status_updated), booking.hall, booking.series_id,
+                booking.requested_at, booking.decided_at)
+
+    @staticmethod
+    def _booking(row):
+        booking_id, user_id, booked_by, start, end, purpose, status, status_updated, hall, series_id, requested_at, decided_at = row
+        return Booking(user_id, booked_by, start, end, purpose, status, bool(status_updated), booking_id, hall, series_id,
+                       requested_at, decided_at)
+
+    def _select(self, table):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {self.COLUMNS} FROM {table} ORDER BY rowid").fetchall()
+        return [self._booking(row) for row in rows]
+
+    def _insert(self, conn, table, bookings):
+        conn.executemany(f"INSERT OR REPLACE INTO {table} ({self.COLUMNS}) VALUES ({self.PLACEHOLDERS})",
+                         [self._row(booking) for booking in bookings])
+
+    def _bump_version(self, conn, key='bookings_version'):
+        before = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+        conn.execute("UPDATE meta SET value = ? WHERE key = ?", (before + 1, key))
+        if key == 'bookings_version':
+            self._writes.bookings = (before, before + 1)
+
+    # One-shot import of the JSON files; skipped once the database has been migrated
+    def migrate_from_json(self, bookings_file, pending_file):
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+                return
+            if bookings_file:
+                self._insert(conn, "bookings", read_booking_file(bookings_file))
+            if pending_file:
+                self._insert(conn, "pending_bookings", read_booking_file(pending_file))
+                self._bump_version(conn, 'pending_version')
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from_json', 1)")
+            self._bump_version(conn)
+
+    def load_bookings(self):
+        return self._select("bookings")
+
+    def load_pending_bookings(self):
+        return self._select("pending_bookings")
+
+    def save_bookings(self, bookings):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM bookings")
+            self._insert(conn, "bookings", bookings)
+            self._bump_version(conn)
+
+    def save_pending_bookings(self, pending_bookings):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pending_bookings")
+            self._insert(conn, "pending_bookings", pending_bookings)
+            self._bump_version(conn, 'pending_version')
+
+    def bookings_version(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'bookings_version'").fetchone()[0]
+
+    def pending_version(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'pending_version'").fetchone()[0]
+
+    def add_bookings(self, bookings):
+        with self._connect(immediate=True) as conn:
+            ensure_slots_free(bookings, self._bookings_near(conn, bookings))
+            self._insert(conn, "bookings", bookings)
+            self._bump_version(conn)
+
+    def cancel_booking(self, booking):
+        with self._connect() as conn:
+            if not conn.execute("DELETE FROM bookings WHERE id = ?", (booking.id,)).rowcount:
+                raise BookingConflictError("This booking was already cancelled.")
+            self._bump_version(conn)
+
+    def add_pending_bookings(self, requests):
+        stamp_requested(requests)
+        with self._connect(immediate=True) as conn:
+            ensure_slots_free(requests, self._bookings_near(conn, requests))
+            self._insert(conn, "pending_bookings", requests)
+            self._bump_version(conn, 'pending_version')
+
+    # Apply a batch of approvals and denials in one transaction
+    def decide(self, approvals, denials):
+        with self._connect(immediate=True) as conn:
+            requests = self._requests_with_ids(conn, [r.id for r in list(approvals) + list(denials)])
+            bookings = self._bookings_near(conn, approvals) if approvals else []
+            approved, denied, skipped = plan_decisions(approvals, denials, requests, bookings)
+            now = to_minutes(datetime.now())
+            approved = [decided_request(request, 'approved', now) for request in approved]
+            denied = [decided_request(request, 'denied', now) for request in denied]
+            conn.executemany("DELETE FROM pending_bookings WHERE id = ?", [(r.id,) for r in approved + denied])
+            self._insert(conn, "notifications", approved + denied)
+            self._insert(conn, "decisions", approved + denied)
+            if approved or denied:
+                self._bump_version(conn, 'pending_version')
+            if approved:
+                self._insert(conn, "bookings", [approved_booking(request) for request in approved])
+                self._bump_version(conn)
+        return approved, denied, skipped
+
+    # Decided requests after `cursor` (a rowid of the decisions table), and the cursor to continue from
+    def load_decisions(self, cursor=0):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT rowid, {self.COLUMNS} FROM decisions WHERE rowid > ? ORDER BY rowid", (cursor,)).fetchall()
+        return [self._booking(row[1:]) for row in rows], (rows[-1][0] if rows else cursor)
+
+    def load_notifications(self, user_id):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {self.COLUMNS} FROM notifications WHERE user_id = ? ORDER BY rowid",
+                                (str(user_id),)).fetchall()
+        return [self._booking(row) for row in rows]
+
+    def acknowledge(self, requests):
+        if not requests:
+            return
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM notifications WHERE id = ?", [(request.id,) for request in requests])
+
+    # Move bookings that ended by `cutoff` (minutes) into archived_bookings
+    def archive_before(self, cutoff):
+        with self._connect() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO archived_bookings ({self.COLUMNS}) "
+                         f"SELECT {self.COLUMNS} FROM bookings WHERE end_minute <= ?", (cutoff,))
+            count = conn.execute("DELETE FROM bookings WHERE end_minute <= ?", (cutoff,)).rowcount
+            if count:
+                self._bump_version(conn)
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'archive_version'")
+        return count
+
+    def load_archived(self, year, month):
+        start, end = month_span(year, month)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {self.COLUMNS} FROM archived_bookings "
+                                "WHERE start_minute >= ? AND start_minute < ? ORDER BY start_minute",
+                                (start, end)).fetchall()
+        return [self._booking(row) for row in rows]
+
+    def archive_version(self, year, month):
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'archive_version'").fetchone()[0]
+
+    def archived_months(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT start_minute FROM archived_bookings").fetchall()
+        return sorted({(from_minutes(start).year, from_minutes(start).month) for start, in rows})
+
+# Bookings, pending requests and unseen decisions (user_id -> {id: Booking})
+# rebuilt from a journal snapshot plus replayed events
+class JournalState:
+    def __init__(self, snapshot):
+        self.segment = snapshot['segment']
+        self.bookings_version = snapshot['bookings_version']
+        self.pending_version = snapshot.get('pending_version', 0)
+        self.bookings = {b.id: b for b in map(Booking.from_dict, snapshot['bookings'])}
+        self.pending = {}
+        self.notifications = {}
+        self._set_pending(map(Booking.from_dict, snapshot['pending_bookings']))
+        for notification in map(Booking.from_dict, snapshot.get('notifications', [])):
+            self.notifications.setdefault(str(notification.user_id), {})[notification.id] = notification
+
+    def to_snapshot(self, segment):
+        return {
+            'segment': segment,
+            'bookings_version': self.bookings_version,
+            'pending_version': self.pending_version,
+            'bookings': [b.to_dict() for b in self.bookings.values()],
+            'pending_bookings': [b.to_dict() for b in self.pending.values()],
+            'notifications': [b.to_dict() for inbox in self.notifications.values() for b in inbox.values()],
+        }
+
+    # Snapshots and events from earlier versions may carry decided requests in
+    # the pending list; those belong in the requester's notifications
+    def _set_pending(self, requests):
+        self.pending = {}
+        for request in requests:
+            if request.status_updated:
+                self.notifications.setdefault(str(request.user_id), {})[request.id] = request
+            else:
+                self.pending[request.id] = request
+
+    def _decide(self, request_id, status, decided_at=None):
+        request = self.pending.pop(request_id, None)
+        if request is None:
+            return
+        self.pending_version += 1
+        # Records are handed out to callers, so replace rather than mutate them
+        request = decided_request(request, status, decided_at)
+        self.notifications.setdefault(str(request.user_id), {})[request.id] = request
+        if status == 'approved':
+            self.bookings[request.id] = request.copy()
+            self.bookings_version += 1
+
+    def apply(self, event):
+        op = event['op']
+        if op == 'book':
+            for data in event.get('bookings') or [event['booking']]:
+                booking = Booking.from_dict(data)
+                self.bookings[booking.id] = booking
+            self.bookings_version += 1
+        elif op == 'request':
+            for data in event.get('bookings') or [event['booking']]:
+                request = Booking.from_dict(data)
+                self.pending[request.id] = request
+            self.pending_version += 1
+        elif op in ('approve', 'deny'):
+            self._decide(event['id'], 'approved' if op == 'approve' else 'denied')
+        elif op == 'decide':
+            for request_id in event['approve']:
+                self._decide(request_id, 'approved', event.get('at'))
+            for request_id in event['deny']:
+                self._decide(request_id, 'denied', event.get('at'))
+        elif op == 'cancel':
+            if self.bookings.pop(event['id'], None) is not None:
+                self.bookings_version += 1
+        elif op == 'ack':
+            ids = set(event['ids'])
+            for user_id, inbox in list(self.notifications.items()):
+                for request_id in ids.intersection(inbox):
+                    del inbox[request_id]
+                if not inbox:
+                    del self.notifications[user_id]
+        elif op == 'archive':
+            for booking_id in event['ids']:
+                self.bookings.pop(booking_id, None)
+            self.bookings_version += 1
+        elif op == 'replace_bookings':
+            self.bookings = {b.id: b for b in map(Booking.from_dict, event['bookings'])}
+            self.bookings_version += 1
+        elif op == 'replace_pending':
+            self._set_pending(map(Booking.from_dict, event['pending_bookings']))
+            self.pending_version += 1
+
+# File-based storage as an append-only event journal plus a periodic snapshot.
+# Each mutation appends one JSON line to the current journal segment. Readers
+# start from the snapshot and replay the segments after it, keeping the replayed
+# state in memory so later loads only read lines appended since the last one.
+# Once the current segment passes compact_bytes a new segment is started and a
+# background thread folds the older ones into a fresh snapshot. Appends that
+# depend on current state check it against the replayed state while holding a
+# short lock on the journal's lock file.
+class JournalStorage(BookingStorage):
+    def __init__(self, snapshot_file, journal_prefix, bookings_file=None, pending_file=None,
+                 compact_bytes=JOURNAL_COMPACT_BYTES, archive_dir=ARCHIVE_DIR, decisions_file=DECISIONS_FILE):
+        self.snapshot_file = snapshot_file
+        self.journal_prefix = journal_prefix
+        self.compact_bytes = compact_bytes
+        self.archive = MonthlyArchive(archive_dir)
+        self.decisions = DecisionLog(decisions_file)
+        self.archived_through = None
+        self._writes = threading.local()
+        self.lock_file = journal_prefix + ".lock"
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._state = None
+        self._offset = 0
+        self._snapshot_signature = None
+        if not os.path.exists(snapshot_file) and not self._segments():
+            # First start: seed the snapshot from the plain JSON files
+            self._write_snapshot({
+                'segment': 0,
+                'bookings_version': 0,
+                'bookings': [b.to_dict() for b in read_booking_file(bookings_file)] if bookings_file else [],
+                'pending_bookings': [b.to_dict() for b in read_booking_file(pending_file)] if pending_file else [],
+            })
+
+    def _segment_path(self, segment):
+        return f"{self.journal_prefix}.{segment:06d}.log"
+
+    def _segments(self):
+        paths = glob.glob(glob.escape(self.journal_prefix) + ".*.log")
+        return sorted(int(path.rsplit('.', 2)[1]) for path in paths)
+
+    def _read_snapshot(self):
+        with open(self.snapshot_file, 'r') as file:
+            return json.load(file)
+
+    def _write_snapshot(self, snapshot):
+        temp_file = self.snapshot_file + ".tmp"
+        with open(temp_file, 'w') as file:
+            json.dump(snapshot, file)
+            METRICS.increment('write_bytes', file.tell(), "Bytes written to booking files.")
+        os.replace(temp_file, self.snapshot_file)
+
+    # Bring the in-memory state up to date: reload if a compaction replaced the
+    # snapshot, otherwise replay only the lines appended since the last refresh
+    def _refresh(self):
+        while True:
+            signature = file_signature(self.snapshot_file)
+            if signature != self._snapshot_signature:
+                self._state = JournalState(self._read_snapshot())
+                self._offset = 0
+                self._snapshot_signature = signature
+            self._replay()
+            if file_signature(self.snapshot_file) == self._snapshot_signature:
+                return
+
+    # Replay runs without the lock file, so another process may compact the
+    # segment away mid-replay. It only deletes segments after swapping in a new
+    # snapshot, so stop here and let _refresh start over from that snapshot.
+    def _replay(self):
+        state = self._state
+        while True:
+            path = self._segment_path(state.segment)
+            try:
+                with open(path, 'rb') as file:
+                    file.seek(self._offset)
+                    data = file.read()
+            except FileNotFoundError:
+                if file_signature(self.snapshot_file) != self._snapshot_signature:
+                    return
+                data = b""
+            # Only whole lines; a concurrent append may be half written
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                state.apply(json.loads(line))
+            self._offset += len(complete)
+            if not os.path.exists(self._segment_path(state.segment + 1)):
+                return
+            state.segment += 1
+            self._offset = 0
+
+    # Append one event; `check`, if given, is called with the up-to-date state
+    # first. It raises BookingConflictError to reject the write, or may return
+    # the event to write in place of `event`.
+    def _append(self, event, check=None):
+        with self._lock, file_lock(self.lock_file):
+            self._refresh()
+            if check is not None:
+                event = check(self._state) or event
+            if event is None:
+                return
+            before = self._state.bookings_version
+            line = (json.dumps(event) + "\n").encode()
+            fd = os.open(self._segment_path(self._state.segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                METRICS.increment('write_bytes', len(line), "Bytes written to booking files.")
+            finally:
+                os.close(fd)
+            # Other writers wait for the lock, so this replays only our own line
+            self._refresh()
+            if self._state.bookings_version != before:
+                self._writes.bookings = (before, self._state.bookings_version)
+            if self._offset >= self.compact_bytes and not self._compacting:
+                # New appends go to the next segment while the old ones are folded
+                next_segment = self._state.segment + 1
+                open(self._segment_path(next_segment), 'a').close()
+                self._compacting = True
+                threading.Thread(target=self._compact, args=(next_segment,), daemon=True).start()
+
+    # Fold every segment before `segment` into a new snapshot, then delete them.
+    # The folding happens without the lock; only swapping the snapshot in does.
+    def _compact(self, segment):
+        try:
+            snapshot = self._read_snapshot()
+            state = JournalState(snapshot)
+            for old_segment in range(state.segment, segment):
+                path = self._segment_path(old_segment)
+                if os.path.exists(path):
+                    with open(path, 'r') as file:
+                        for line in file:
+                            state.apply(json.loads(line))
+            with file_lock(self.lock_file):
+                if self._read_snapshot()['segment'] != snapshot['segment']:
+                    # Another process compacted in the meantime
+                    return
+                self._write_snapshot(state.to_snapshot(segment))
+                for old_segment in self._segments():
+                    if old_segment < segment:
+                        os.remove(self._segment_path(old_segment))
+        finally:
+            self._compacting = False
+
+    def load_bookings(self):
+        with self._lock:
+            self._refresh()
+            return list(self._state.bookings.values())
+
+    def load_pending_bookings(self):
+        with self._lock:
+            self._refresh()
+            return list(self._state.pending.values())
+
+    def bookings_version(self):
+        with self._lock:
+            self._refresh()
+            return self._state.bookings_version
+
+    def pending_version(self):
+        with self._lock:
+            self._refresh()
+            return self._state.pending_version
+
+    def save_bookings(self, bookings):
+        self._append({'op': 'replace_bookings', 'bookings': [b.to_dict() for b in bookings]})
+
+    def save_pending_bookings(self, pending_bookings):
+        self._append({'op': 'replace_pending', 'pending_bookings': [b.to_dict() for b in pending_bookings]})
+
+    def add_bookings(self, bookings):
+        self._append({'op': 'book', 'bookings': [b.to_dict() for b in bookings]},
+                     lambda state: ensure_slots_free(bookings, list(state.bookings.values())))
+
+    def cancel_booking(self, booking):
+        def check(state):
+            if booking.id not in state.bookings:
+                raise BookingConflictError("This booking was already cancelled.")
+        self._append({'op': 'cancel', 'id': booking.id}, check)
+
+    def add_pending_bookings(self, requests):
+        stamp_requested(requests)
+        self._append({'op': 'request', 'bookings': [r.to_dict() for r in requests]},
+                     lambda state: ensure_slots_free(requests, list(state.bookings.values())))
+
+    # Apply a batch of approvals and denials as a single journal line
+    def decide(self, approvals, denials):
+        plan = []
+        now = to_minutes(datetime.now())
+
+        def check(state):
+            decided = [b for inbox in state.notifications.values() for b in inbox.values()]
+            plan[:] = plan_decisions(approvals, denials, list(state.pending.values()) + decided,
+                                     list(state.bookings.values()))
+            approved, denied, _ = plan
+            if approved or denied:
+                return {'op': 'decide', 'approve': [r.id for r in approved], 'deny': [r.id for r in denied], 'at': now}
+
+        self._append(None, check)
+        approved, denied, skipped = plan
+        approved = [decided_request(r, 'approved', now) for r in approved]
+        denied = [decided_request(r, 'denied', now) for r in denied]
+        self.decisions.append(approved + denied)
+        return approved, denied, skipped
+
+    # Decided requests after `cursor`, and the cursor to continue from
+    def load_decisions(self, cursor=0):
+        return self.decisions.read(cursor)
+
+    def load_notifications(self, user_id):
+        with self._lock:
+            self._refresh()
+            return list(self._state.notifications.get(str(user_id), {}).values())
+
+    def acknowledge(self, requests):
+        if requests:
+            self._append({'op': 'ack', 'ids': [request.id for request in requests]})
+
+    # Move bookings that ended by `cutoff` (minutes) into the monthly archive
+    def archive_before(self, cutoff):
+        finished = []
+
+        # Picked from the current state and written to the archive under the
+        # journal lock, so a booking cancelled meanwhile is not archived and two
+        # archivers never write the same partition at once
+        def check(state):
+            finished[:] = [b for b in state.bookings.values() if b.end <= cutoff]
+            if finished:
+                self.archive.add(finished)
+                return {'op': 'archive', 'ids': [b.id for b in finished]}
+
+        self._append(None, check)
+        return len(finished)
+
+    def load_archived(self, year, month):
+        return self.archive.load(year, month)
+
+    def archive_version(self, year, month):
+        return self.archive.version(year, month)
+
+    def archived_months(self):
+        return self.archive.months()
+
+# Time the storage operations of every backend, as spans like "json.load_bookings"
+STORAGE_OPERATIONS = (
+    'load_bookings', 'load_pending_bookings', 'save_bookings', 'save_pending_bookings', 'bookings_version', 'pending_version',
+    'add_bookings', 'add_pending_bookings', 'cancel_booking', 'decide', 'load_notifications', 'acknowledge',
+    'archive_before', 'load_archived', 'load_decisions',
+)
+for storage_class, prefix in ((JsonStorage, "json"), (SqliteStorage, "sqlite"), (JournalStorage, "journal")):
+    instrument(storage_class, STORAGE_OPERATIONS, prefix)
+
+# Function to open a storage backend by name: "json", "sqlite" or "journal"
+def open_storage(backend=STORAGE_BACKEND):
+    if backend == "sqlite":
+        return SqliteStorage(SQLITE_FILE, BOOKINGS_FILE, PENDING_FILE)
+    if backend == "journal":
+        return JournalStorage(JOURNAL_SNAPSHOT_FILE, JOURNAL_PREFIX, BOOKINGS_FILE, PENDING_FILE)
+    if backend == "json":
+        return JsonStorage(BOOKINGS_FILE, PENDING_FILE)
+    raise ValueError(f"Unknown storage backend {backend!r}")
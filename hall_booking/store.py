@@ -0,0 +1,78 @@
+# Confirmed bookings and pending requests held in memory once per process and
+# shared by every caller, e.g. all sessions of the Streamlit app. Reads come
+# from memory and only go back to the storage when its bookings or pending
+# version has changed. Writes go through to the storage first and are then
+# applied to a copy of the index that replaces the shared one, so a caller
+# still holding the previous index never sees it change under it.
+import threading
+
+from .index import BookingIndex
+from .metrics import METRICS
+from .storage import BookingConflictError
+
+class SharedBookingStore:
+    def __init__(self, storage):
+        self.storage = storage
+        self.index = None
+        self.pending = []
+        self.pending_version = None
+        # Held while rebuilding and across each write and its index update, so
+        # writes from this process are applied in the order they were stored
+        self._lock = threading.RLock()
+
+    # The booking index for the current bookings version
+    def get_index(self):
+        version = self.storage.bookings_version()
+        index = self.index
+        if index is not None and index.version == version:
+            return index
+        with self._lock:
+            if self.index is None or self.index.version != version:
+                with METRICS.span("build_booking_index"):
+                    index = BookingIndex(self.storage.load_bookings())
+                index.version = version
+                self.index = index
+            return self.index
+
+    # The pending requests, re-read only when the pending version changed.
+    # The list is a copy; the requests in it are shared and must not be changed.
+    def get_pending(self):
+        version = self.storage.pending_version()
+        with self._lock:
+            if version != self.pending_version:
+                with METRICS.span("load_pending_requests"):
+                    self.pending = self.storage.load_pending_bookings()
+                self.pending_version = version
+            return list(self.pending)
+
+    # Run a storage write and apply its effect to the shared index instead of
+    # rebuilding it. When the written bookings depend on the outcome, `added`
+    # picks them from the result.
+    def write(self, write, *args, added=(), removed=()):
+        with self._lock:
+            index = self.get_index()
+            try:
+                result = write(*args)
+            except BookingConflictError:
+                # Someone else changed the bookings; rebuild from storage next time
+                self.index = None
+                raise
+            if callable(added):
+                added = added(result)
+            if not added and not removed:
+                return result
+            updated = index.copy()
+            for booking in added:
+                updated.add(booking)
+            for booking in removed:
+                updated.remove(booking)
+            # Install the patched copy only if this write was the one change
+            # since the index was built; otherwise it would miss someone else's
+            # write, so rebuild from storage next time instead
+            version = self.storage.bookings_version()
+            if self.storage.last_bookings_write() != (index.version, version):
+                self.index = None
+                return result
+            updated.version = version
+            self.index = updated
+            return result
@@ -0,0 +1,128 @@
+# Tests for the interval index and the batch conflict check, compared against
+# brute-force pairwise checks on random intervals
+import random
+
+import pytest
+
+from hall_booking import Booking, BookingIndex, IntervalIndex, find_batch_conflicts
+
+# Function to check a pair of half-open intervals for overlap
+def overlap(a_start, a_end, b_start, b_end):
+    return a_start < b_end and b_start < a_end
+
+# Function to draw random (start, end) intervals
+def random_intervals(rng, count, span=500, longest=60):
+    intervals = []
+    for _ in range(count):
+        start = rng.randrange(span)
+        intervals.append((start, start + rng.randrange(1, longest)))
+    return intervals
+
+# Function to find the free gaps of at least min_length in [start, end) minute by minute
+def brute_force_gaps(intervals, start, end, min_length):
+    gaps, gap_start = [], None
+    for minute in range(start, end + 1):
+        busy = minute < end and any(s <= minute < e for s, e in intervals)
+        if minute < end and not busy:
+            gap_start = minute if gap_start is None else gap_start
+        elif gap_start is not None:
+            if minute - gap_start >= min_length:
+                gaps.append((gap_start, minute))
+            gap_start = None
+    return gaps
+
+def test_overlaps_touching_intervals():
+    index = IntervalIndex([(60, 120)])
+    assert index.overlaps(90, 100)
+    assert index.overlaps(30, 61)
+    assert not index.overlaps(0, 60)
+    assert not index.overlaps(120, 180)
+    assert not IntervalIndex().overlaps(0, 1000)
+
+def test_overlaps_long_interval_behind_short_ones():
+    # The running max end finds the long booking although later ones end sooner
+    index = IntervalIndex([(0, 1000), (100, 110), (200, 210)])
+    assert index.overlaps(500, 510)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_overlaps_matches_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = random_intervals(rng, 40)
+    index = IntervalIndex(intervals)
+    for start, end in random_intervals(rng, 200):
+        assert index.overlaps(start, end) == any(overlap(start, end, s, e) for s, e in intervals)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_free_gaps_matches_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = random_intervals(rng, 15)
+    index = IntervalIndex(intervals)
+    for start, end in random_intervals(rng, 30, longest=300):
+        for min_length in (1, 15, 45):
+            assert index.free_gaps(start, end, min_length) == brute_force_gaps(intervals, start, end, min_length)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_add_and_remove_keep_the_index_consistent(seed):
+    rng = random.Random(seed)
+    index, intervals = IntervalIndex(), []
+    for step in range(300):
+        if intervals and rng.random() < 0.4:
+            interval = intervals.pop(rng.randrange(len(intervals)))
+            assert index.remove(*interval)
+        else:
+            interval = random_intervals(rng, 1)[0]
+            index.add(*interval)
+            intervals.append(interval)
+        assert sorted(zip(index.starts, index.ends)) == sorted(intervals)
+        assert index.starts == sorted(index.starts)
+        assert index.max_ends == [max(index.ends[:i + 1]) for i in range(len(index.ends))]
+    assert not index.remove(10 ** 6, 10 ** 6 + 1)
+
+def test_copy_is_independent():
+    index = IntervalIndex([(0, 10)])
+    copy = index.copy()
+    copy.add(20, 30)
+    assert len(index) == 1 and not index.overlaps(20, 30)
+    assert copy.overlaps(20, 30)
+
+def test_batch_conflicts_with_confirmed_bookings():
+    index = BookingIndex([Booking("1", "Ann", 100, 160, status='approved', hall="Main Hall")])
+    existing, internal = find_batch_conflicts([120, 160, 120], [130, 200, 130], ["Main Hall", "Main Hall", "Other Hall"], index)
+    assert existing.tolist() == [True, False, False]
+    assert internal.tolist() == [False, False, False]
+
+def test_batch_conflicts_only_kept_candidates_block():
+    # 09:00-10:00 is kept, 09:30-11:00 is rejected by it, and 10:30-11:30 only
+    # overlaps the rejected one, so it is kept
+    existing, internal = find_batch_conflicts([540, 570, 630], [600, 660, 690], ["Main Hall"] * 3, BookingIndex([]))
+    assert existing.tolist() == [False, False, False]
+    assert internal.tolist() == [False, True, False]
+
+def test_batch_conflicts_per_hall():
+    existing, internal = find_batch_conflicts([0, 0, 5], [10, 10, 15], ["Main Hall", "Other Hall", "Main Hall"], BookingIndex([]))
+    assert internal.tolist() == [False, False, True]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_conflicts_match_a_greedy_sweep(seed):
+    rng = random.Random(seed)
+    halls = ["Main Hall", "Other Hall"]
+    booked = [Booking("1", "Ann", s, e, status='approved', hall=rng.choice(halls)) for s, e in random_intervals(rng, 20)]
+    candidates = random_intervals(rng, 60)
+    candidate_halls = [rng.choice(halls) for _ in candidates]
+    existing, internal = find_batch_conflicts([s for s, _ in candidates], [e for _, e in candidates], candidate_halls,
+                                              BookingIndex(booked))
+
+    kept = []
+    expected_existing, expected_internal = [False] * len(candidates), [False] * len(candidates)
+    for i, (start, end) in enumerate(candidates):
+        expected_existing[i] = any(b.hall == candidate_halls[i] and overlap(start, end, b.start, b.end) for b in booked)
+    for i in sorted(range(len(candidates)), key=lambda i: (candidates[i][0], candidates[i][1])):
+        if expected_existing[i]:
+            continue
+        start, end = candidates[i]
+        if any(candidate_halls[j] == candidate_halls[i] and overlap(start, end, *candidates[j]) for j in kept):
+            expected_internal[i] = True
+        else:
+            kept.append(i)
+    assert existing.tolist() == expected_existing
+    assert internal.tolist() == expected_internal
@@ -0,0 +1,158 @@
+# Tests for the storage backends: writes that must not double-book a hall,
+# decisions racing each other from separate storage objects (as separate
+# processes would), and journal compaction
+import threading
+
+import pytest
+
+from hall_booking import Booking, BookingConflictError, JournalStorage, JsonStorage, SqliteStorage
+
+HOUR = 60
+# A day about a century after EPOCH, in minutes, so no booking is in the past
+DAY = 100 * 365 * 24 * 60
+
+# Function to open a storage backend on files under `directory`; every call
+# returns a new object over the same files
+def open_backend(backend, directory, **kwargs):
+    if backend == "json":
+        return JsonStorage(str(directory / "bookings.json"), str(directory / "pending.json"), str(directory / "archive"),
+                           str(directory / "notifications.json"), str(directory / "decisions.jsonl"))
+    if backend == "sqlite":
+        return SqliteStorage(str(directory / "bookings.db"))
+    return JournalStorage(str(directory / "snapshot.json"), str(directory / "journal"), archive_dir=str(directory / "archive"),
+                          decisions_file=str(directory / "decisions.jsonl"), **kwargs)
+
+# Function to make a booking or request for `hours` starting `start` hours into DAY
+def booking_at(start, hours=1, user_id="1", hall=None):
+    return Booking(user_id, f"Employee {user_id}", DAY + start * HOUR, DAY + (start + hours) * HOUR, "Meeting", hall=hall)
+
+# Function to run `call(i)` on `count` threads at once, returning each result or exception
+def run_together(count, call):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = call(i)
+        except Exception as error:
+            results[i] = error
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+@pytest.fixture(params=["json", "sqlite", "journal"])
+def backend(request):
+    return request.param
+
+def test_booking_a_taken_slot_is_rejected(backend, tmp_path):
+    storage = open_backend(backend, tmp_path)
+    storage.add_booking(booking_at(10, 2))
+    with pytest.raises(BookingConflictError):
+        storage.add_booking(booking_at(11))
+    with pytest.raises(BookingConflictError):
+        storage.add_pending(booking_at(9, 2))
+    storage.add_booking(booking_at(12))
+    assert len(storage.load_bookings()) == 2
+    assert storage.load_pending_bookings() == []
+
+def test_a_batch_is_stored_all_or_nothing(backend, tmp_path):
+    storage = open_backend(backend, tmp_path)
+    storage.add_booking(booking_at(10))
+    with pytest.raises(BookingConflictError):
+        storage.add_bookings([booking_at(8), booking_at(10)])
+    assert len(storage.load_bookings()) == 1
+
+def test_concurrent_bookings_of_one_slot(backend, tmp_path):
+    open_backend(backend, tmp_path)
+    storages = [open_backend(backend, tmp_path) for _ in range(8)]
+    results = run_together(8, lambda i: storages[i].add_booking(booking_at(10, user_id=str(i))))
+    assert sum(not isinstance(result, Exception) for result in results) == 1
+    assert all(result is None or isinstance(result, BookingConflictError) for result in results)
+    assert len(open_backend(backend, tmp_path).load_bookings()) == 1
+
+def test_approve_and_deny(backend, tmp_path):
+    storage = open_backend(backend, tmp_path)
+    first, second = booking_at(10), booking_at(12)
+    storage.add_pending_bookings([first, second])
+    approved = storage.approve(first)
+    assert (approved.id, approved.status, approved.decided_at is not None) == (first.id, 'approved', True)
+    storage.deny(second)
+    assert [b.id for b in storage.load_bookings()] == [first.id]
+    assert storage.load_pending_bookings() == []
+    assert sorted(b.status for b in storage.load_notifications("1")) == ['approved', 'denied']
+    with pytest.raises(BookingConflictError):
+        storage.deny(first)
+
+def test_approving_into_a_taken_slot_is_skipped(backend, tmp_path):
+    storage = open_backend(backend, tmp_path)
+    early, late = booking_at(10, 2), booking_at(11, 2)
+    storage.add_pending(early)
+    storage.add_pending(late)
+    approved, denied, skipped = storage.decide([early, late], [])
+    assert [b.id for b in approved] == [early.id]
+    assert [b.id for b, _ in skipped] == [late.id]
+    assert [b.id for b in storage.load_pending_bookings()] == [late.id]
+
+def test_concurrent_decisions_on_one_request(backend, tmp_path):
+    pending = booking_at(10)
+    open_backend(backend, tmp_path).add_pending(pending)
+    storages = [open_backend(backend, tmp_path) for _ in range(6)]
+    # Half approve and half deny; exactly one decision wins
+    results = run_together(6, lambda i: storages[i].decide([pending], []) if i % 2 else storages[i].decide([], [pending]))
+    decided = [result for result in results if result[0] or result[1]]
+    assert len(decided) == 1
+    assert all(len(result[2]) == 1 for result in results if result not in decided)
+    storage = open_backend(backend, tmp_path)
+    assert len(storage.load_notifications("1")) == 1
+    assert len(storage.load_bookings()) == (1 if decided[0][0] else 0)
+
+def test_concurrent_approvals_of_overlapping_requests(backend, tmp_path):
+    requests = [booking_at(10, 2, user_id=str(i)) for i in range(6)]
+    storage = open_backend(backend, tmp_path)
+    for pending in requests:
+        storage.add_pending(pending)
+    storages = [open_backend(backend, tmp_path) for _ in range(6)]
+    results = run_together(6, lambda i: storages[i].decide([requests[i]], []))
+    assert sum(len(result[0]) for result in results) == 1
+    assert len(open_backend(backend, tmp_path).load_bookings()) == 1
+
+def test_cancel_twice(backend, tmp_path):
+    storage = open_backend(backend, tmp_path)
+    booking = booking_at(10)
+    storage.add_booking(booking)
+    storage.cancel_booking(booking)
+    with pytest.raises(BookingConflictError):
+        storage.cancel_booking(booking)
+    assert storage.load_bookings() == []
+
+def test_journal_compaction_keeps_the_state(tmp_path):
+    storage = open_backend("journal", tmp_path, compact_bytes=2000)
+    bookings = [booking_at(hour) for hour in range(0, 200, 2)]
+    for booking in bookings:
+        storage.add_booking(booking)
+    storage.cancel_booking(bookings[0])
+    # Compaction runs in the background; wait for the last one to finish
+    while storage._compacting:
+        threading.Event().wait(0.01)
+    assert storage._read_snapshot()['segment'] > 0
+
+    reopened = open_backend("journal", tmp_path)
+    expected = sorted(b.id for b in bookings[1:])
+    assert sorted(b.id for b in reopened.load_bookings()) == expected
+    assert sorted(b.id for b in storage.load_bookings()) == expected
+    assert reopened.bookings_version() == storage.bookings_version()
+
+def test_journal_readers_follow_a_compaction_by_another_writer(tmp_path):
+    reader = open_backend("journal", tmp_path)
+    writer = open_backend("journal", tmp_path, compact_bytes=1000)
+    for hour in range(0, 100, 2):
+        writer.add_booking(booking_at(hour))
+        assert len(reader.load_bookings()) == hour // 2 + 1
+    while writer._compacting:
+        threading.Event().wait(0.01)
+    assert len(reader.load_bookings()) == 50